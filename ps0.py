@@ -6,6 +6,7 @@ Instead of dropping chips from top, the chips enter from bottom up.
 Stage 1 = create the board and allow players to place chips and check if moves are valid.
 Stage 2 = check for win condition (vertical columns)
 Stage 3 = check for win condition (horizontal columns)
+Stage 4 = bitboard backend so win checks don't scale with the board size (also checks diagonals)
 
 """
 
@@ -36,6 +37,8 @@ from typing import List, Tuple, Deque, Optional
 from collections import deque
 
 
+# Original deque backed column. Board now stores bitboards instead, but this is kept as the simple
+# reference version of the rules (handy for cross-checking the bitboard results).
 class Column:
     def __init__(self, col_idx: int, n_slots: int):
         self.slots = deque(["_" for i in range(n_slots)])
@@ -86,6 +89,16 @@ class Column:
 
 
 class Board:
+    # Bitboard backend: one arbitrary-precision int per player.
+    # Column c owns bits [c * stride, c * stride + n_rows), bit 0 of a column is the bottom slot.
+    # stride = n_rows + 1 leaves one always-empty bit on top of every column, so the shifts used
+    # by the win checks can never carry a run from the top of one column into the next column.
+    #
+    #   direction      shift
+    #   vertical       1
+    #   horizontal     stride
+    #   diagonal /     stride + 1
+    #   diagonal \     stride - 1
     def __init__(
         self,
         players,
@@ -94,18 +107,28 @@ class Board:
         player_starts: str,
         s_to_win: int,
     ):
-        self.columns = [Column(col_idx, n_rows) for col_idx in range(n_columns)]
+        self.n_columns = n_columns
+        self.n_rows = n_rows
+        self.stride = n_rows + 1
+        self.column_mask = (1 << n_rows) - 1  # all slots of one column, before shifting into place
+        self.heights = [0] * n_columns  # number of chips in each column
+        # Run-length counters for the last move: who owns the bottom slot of each column and how
+        # many of their chips are stacked on top of it. Only the bottom slot can start a new vertical run.
+        self.bottom = [None] * n_columns
+        self.bottom_run = [0] * n_columns
+        self.history = []  # (column_idx, previous bottom, previous bottom_run) per drop, so it can be undone
+        self.n_chips = 0
+        self.bitboards = {player: 0 for player in players}
         self.current_turn = player_starts
         self.players = players  # Initialize players list
         self.to_win = s_to_win
-        display_array = None
+        self.display_array = None
 
     def place_chip(self, column_idx: int):
-        if 0 <= column_idx < len(self.columns):
-            column = self.columns[column_idx]
-            if column.is_avail():
+        if 0 <= column_idx < self.n_columns:
+            if self.is_avail(column_idx):
                 print("Valid move")
-                column.insert(self.current_turn)
+                self.drop(column_idx)
                 return True
             else:
                 print("Invalid, try another column")
@@ -114,11 +137,47 @@ class Board:
             print("Invalid column index")
             return False
 
+    def is_avail(self, column_idx: int) -> bool:
+        return self.heights[column_idx] < self.n_rows
+
+    def drop(self, column_idx: int):
+        # Same as Column.insert: the new chip enters at the bottom and pushes the rest of the column up by 1.
+        # No validation or printing here, callers must check is_avail() first.
+        shift = column_idx * self.stride
+        for player, bitboard in self.bitboards.items():
+            seg = (bitboard >> shift) & self.column_mask
+            if seg:
+                # clear the old column and write it back 1 slot higher in one xor
+                self.bitboards[player] = bitboard ^ ((seg ^ (seg << 1)) << shift)
+        self.bitboards[self.current_turn] |= 1 << shift
+        self.history.append(
+            (column_idx, self.bottom[column_idx], self.bottom_run[column_idx])
+        )
+        if self.bottom[column_idx] == self.current_turn:
+            self.bottom_run[column_idx] += 1
+        else:
+            self.bottom[column_idx] = self.current_turn
+            self.bottom_run[column_idx] = 1
+        self.heights[column_idx] += 1
+        self.n_chips += 1
+
+    def undo(self):
+        # Reverse of drop(): take the last chip back out of the bottom of its column and shift the column down by 1.
+        # Like drop(), this does not touch current_turn.
+        column_idx, self.bottom[column_idx], self.bottom_run[column_idx] = (
+            self.history.pop()
+        )
+        shift = column_idx * self.stride
+        for player, bitboard in self.bitboards.items():
+            seg = (bitboard >> shift) & self.column_mask
+            if seg:
+                self.bitboards[player] = bitboard ^ ((seg ^ (seg >> 1)) << shift)
+        self.heights[column_idx] -= 1
+        self.n_chips -= 1
+        return column_idx
+
     def slots_avail(self):
-        for col in self.columns:
-            if col.is_avail():
-                return True
-        return False
+        return self.n_chips < self.n_columns * self.n_rows
 
     def next_player(self):
         # Go through the players list and pick the next one in line:
@@ -134,36 +193,81 @@ class Board:
             next_idx = curr_idx + 1
         self.current_turn = self.players[next_idx]
 
-    def check_column_win(self) -> Optional[str]:  # Fixed return type
-        for col in self.columns:
-            winner = col.is_consecutive(
-                col.slots,
-                self.to_win,
-                self.players,
-            )  # Fixed: added missing players parameter
-            if winner:
-                return winner
-        return None
+    @staticmethod
+    def has_run(bitboard: int, shift: int, s_to_win: int) -> bool:
+        # AND the board with itself shifted 1..s-1 steps along a direction.
+        # Any bit that survives is the start of s chips in a row.
+        run = bitboard
+        for k in range(1, s_to_win):
+            run &= bitboard >> (k * shift)
+            if not run:  # nothing left to extend, stop early
+                return False
+        return run != 0
 
-    def check_horizontal_win(self):
-        # We can reuse the display array since it is already in row-wise
-        for row in self.display_array:
-            winner = Column.is_consecutive(  # Also just reuse the consecutive check from column since it is the same...
-                row,
-                self.to_win,
-                self.players,
-            )
-            if winner:
-                return winner
+    def check_direction_win(self, shift: int) -> Optional[str]:
+        for player, bitboard in self.bitboards.items():
+            if self.has_run(bitboard, shift, self.to_win):
+                return player
         return None
 
+    def check_column_win(self) -> Optional[str]:  # Fixed return type
+        return self.check_direction_win(1)
+
+    def check_horizontal_win(self) -> Optional[str]:
+        return self.check_direction_win(self.stride)
+
+    def check_diagonal_win(self) -> Optional[str]:
+        return self.check_direction_win(self.stride + 1) or self.check_direction_win(
+            self.stride - 1
+        )
+
+    def check_last_move_win(self, column_idx: int) -> List[str]:
+        # Only lines through the column that was just dropped into can have changed, so we don't need to rescan the board.
+        # Because chips enter from the bottom, every chip in that column moved up by 1, so a new horizontal/diagonal run
+        # can appear at any height of the column (and for any player), not just next to the new chip.
+        winners = []
+        # vertical: the only new run is the one starting at the bottom, which we already count in drop()
+        if self.bottom_run[column_idx] >= self.to_win:
+            winners.append(self.bottom[column_idx])
+
+        # horizontal + diagonals: any s-in-a-row through this column lies within s - 1 columns either side of it,
+        # so cut that window out of each bitboard and run the shift-and-AND checks on the window only.
+        lo = max(0, column_idx - self.to_win + 1)
+        hi = min(self.n_columns - 1, column_idx + self.to_win - 1)
+        window_mask = (1 << ((hi - lo + 1) * self.stride)) - 1
+        for player, bitboard in self.bitboards.items():
+            if player in winners:
+                continue
+            window = (bitboard >> (lo * self.stride)) & window_mask
+            if not window:
+                continue
+            for shift in (self.stride, self.stride + 1, self.stride - 1):
+                if self.has_run(window, shift, self.to_win):
+                    winners.append(player)
+                    break  # stop at the first line found for this player
+        return winners
+
+    def slots(self, column_idx: int) -> List[str]:
+        # Rebuild the old Column.slots view (bottom first) from the bitboards, only needed for printing.
+        shift = column_idx * self.stride
+        column = ["_"] * self.n_rows
+        for player, bitboard in self.bitboards.items():
+            seg = (bitboard >> shift) & self.column_mask
+            while seg:
+                low = seg & -seg
+                column[low.bit_length() - 1] = player
+                seg ^= low
+        return column
+
     def update_display(self):
-        self.display_array = [list(x) for x in zip(*[c.slots for c in self.columns])]
+        self.display_array = [
+            list(x) for x in zip(*[self.slots(c) for c in range(self.n_columns)])
+        ]
         for r in reversed(self.display_array):
             print(r)
         # Also print the bottom row for visibility:
-        print("-----" * len(self.columns))
-        print([f"{n}" for n in range(len(self.columns))])
+        print("-----" * self.n_columns)
+        print([f"{n}" for n in range(self.n_columns)])
 
 
 def play():
@@ -176,7 +280,7 @@ def play():
     # Setup the board
     board = Board(PLAYERS, COLUMNS, ROWS, STARTING_PLAYER, TO_WIN)
     board.update_display()
-    winner = None
+    winner = set()
 
     # Start playing
     while board.slots_avail():
@@ -184,20 +288,18 @@ def play():
             f"Player <{board.current_turn}> please choose the column idx (0 - {COLUMNS-1}) that you want to place your chip in: "
         )
         try:
-            assert isinstance(player_input, int)
-        except:
+            col_idx = int(player_input)  # input() always gives a str, so convert instead of isinstance()
+        except ValueError:
             print("Invalid column, enter an integer.")
             continue
-        col_idx = int(player_input)  # Assume they will enter an int.
         valid = board.place_chip(
             col_idx
         )  # If valid, will go to the next person, if not, same person's turn
         if valid:
             board.update_display()
-            winner_vert = board.check_column_win()
-            winner_hori = board.check_horizontal_win()
-            if winner_vert or winner_hori:
-                winners = filter(None, [winner_vert, winner_hori])
+            # only check the lines through the column we just changed, O(s) instead of O(board)
+            winners = board.check_last_move_win(col_idx)
+            if winners:
                 winner = set(winners)
                 break
             board.next_player()
@@ -0,0 +1,243 @@
+"""
+Headless simulator for the connect N game in ps0.py.
+Plays (or replays) thousands of games without input() / printing / update_display
+and spreads them over a ProcessPoolExecutor, so rule variants can be load tested.
+
+Results are compact arrays, one entry per game:
+    winners[i] = index of the winning player in `players`, DRAW or MULTIPLE_WINNERS
+    lengths[i] = number of chips placed
+"""
+
+# Usage
+# result = simulate(10_000, n_columns=8, n_rows=8, s_to_win=4, policies=("greedy", "random"))
+# result.summary() --> {"A": 6012, "B": 3890, "draw": 98, "multiple": 0}
+# result = replay([[0, 1, 0, 1, 0, 1, 0], ...]) --> same thing for recorded move sequences
+
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+from ps0 import Board
+
+DRAW = -1  # board filled up with no winner
+MULTIPLE_WINNERS = -2  # the column shift completed lines for more than 1 player on the same move
+
+
+# Policies: take the board (current_turn is the player to move) and a Random, return a column idx that is available.
+def random_policy(board: Board, rng: random.Random) -> int:
+    # Rejection sample first, it's O(1) until the board is nearly full
+    for _ in range(8):
+        column_idx = rng.randrange(board.n_columns)
+        if board.is_avail(column_idx):
+            return column_idx
+    return rng.choice([c for c in range(board.n_columns) if board.is_avail(c)])
+
+
+def greedy_policy(board: Board, rng: random.Random) -> int:
+    # Take a move that wins right away, otherwise block a column where the next player would win, otherwise random.
+    # Every try is a drop() + undo(), so this costs O(columns * s) per move.
+    avail = [c for c in range(board.n_columns) if board.is_avail(c)]
+    player = board.current_turn
+    blocks = []
+    for column_idx in avail:
+        board.drop(column_idx)
+        winners = board.check_last_move_win(column_idx)
+        board.undo()
+        if player in winners:
+            return column_idx
+
+    board.next_player()
+    opponent = board.current_turn
+    for column_idx in avail:
+        board.drop(column_idx)
+        winners = board.check_last_move_win(column_idx)
+        board.undo()
+        if opponent in winners:
+            blocks.append(column_idx)
+    board.current_turn = player
+
+    if blocks:
+        return rng.choice(blocks)
+    return rng.choice(avail)
+
+
+POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+
+Policy = Union[str, Callable[[Board, random.Random], int]]
+
+
+def _result_code(winners: List[str], players: Sequence[str]) -> int:
+    if len(winners) > 1:
+        return MULTIPLE_WINNERS
+    return players.index(winners[0])
+
+
+def play_game(
+    n_columns: int,
+    n_rows: int,
+    s_to_win: int,
+    players: Sequence[str],
+    policies: Sequence[Policy],
+    seed: int,
+) -> Tuple[int, int]:
+    # One game with no printing, policies[i] plays for players[i] and players[0] starts.
+    players = list(players)
+    policy_fns = [POLICIES[p] if isinstance(p, str) else p for p in policies]
+    rng = random.Random(seed)
+    board = Board(players, n_columns, n_rows, players[0], s_to_win)
+    turn = 0
+    while board.slots_avail():
+        column_idx = policy_fns[turn](board, rng)
+        board.drop(column_idx)
+        winners = board.check_last_move_win(column_idx)
+        if winners:
+            return _result_code(winners, players), board.n_chips
+        turn = (turn + 1) % len(players)
+        board.current_turn = players[turn]
+    return DRAW, board.n_chips
+
+
+def replay_game(
+    moves: Sequence[int],
+    n_columns: int,
+    n_rows: int,
+    s_to_win: int,
+    players: Sequence[str],
+) -> Tuple[int, int]:
+    # Recorded game, moves are column idxs in turn order starting with players[0].
+    # Stops at the first win, any moves after that are ignored.
+    players = list(players)
+    board = Board(players, n_columns, n_rows, players[0], s_to_win)
+    turn = 0
+    for column_idx in moves:
+        if not (0 <= column_idx < n_columns and board.is_avail(column_idx)):
+            raise ValueError(
+                f"Invalid move {column_idx} at move {board.n_chips} of recorded game"
+            )
+        board.drop(column_idx)
+        winners = board.check_last_move_win(column_idx)
+        if winners:
+            return _result_code(winners, players), board.n_chips
+        turn = (turn + 1) % len(players)
+        board.current_turn = players[turn]
+    return DRAW, board.n_chips
+
+
+class SimResult:
+    def __init__(self, players: Sequence[str], winners: array, lengths: array):
+        self.players = list(players)
+        self.winners = winners  # array('b'), see DRAW / MULTIPLE_WINNERS
+        self.lengths = lengths  # array('i')
+
+    def __len__(self):
+        return len(self.winners)
+
+    def summary(self) -> dict:
+        counts = [0] * (len(self.players) + 2)  # last 2 slots are DRAW (-1) and MULTIPLE_WINNERS (-2)
+        for code in self.winners:
+            counts[code] += 1
+        summary = {p: counts[i] for i, p in enumerate(self.players)}
+        summary["draw"] = counts[DRAW]
+        summary["multiple"] = counts[MULTIPLE_WINNERS]
+        return summary
+
+    def mean_length(self) -> float:
+        return sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+
+# Workers get a whole chunk of games and send back 2 arrays, so pickling cost is per chunk and not per game.
+def _play_chunk(args) -> Tuple[array, array]:
+    n_columns, n_rows, s_to_win, players, policies, seeds = args
+    winners, lengths = array("b"), array("i")
+    for seed in seeds:
+        code, n_moves = play_game(n_columns, n_rows, s_to_win, players, policies, seed)
+        winners.append(code)
+        lengths.append(n_moves)
+    return winners, lengths
+
+
+def _replay_chunk(args) -> Tuple[array, array]:
+    n_columns, n_rows, s_to_win, players, games = args
+    winners, lengths = array("b"), array("i")
+    for moves in games:
+        code, n_moves = replay_game(moves, n_columns, n_rows, s_to_win, players)
+        winners.append(code)
+        lengths.append(n_moves)
+    return winners, lengths
+
+
+def _run_chunks(fn, chunks, players, workers: Optional[int]) -> SimResult:
+    winners, lengths = array("b"), array("i")
+    if workers == 1 or len(chunks) <= 1:
+        for w, l in map(fn, chunks):
+            winners.extend(w)
+            lengths.extend(l)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for w, l in pool.map(fn, chunks):  # map() keeps the chunk order, so game i stays at index i
+                winners.extend(w)
+                lengths.extend(l)
+    return SimResult(players, winners, lengths)
+
+
+def _chunk_size(n_games: int, workers: Optional[int]) -> int:
+    # ~4 chunks per worker so a slow chunk doesn't hold up the whole pool
+    n_workers = workers or os.cpu_count() or 1
+    return max(1, -(-n_games // (n_workers * 4)))
+
+
+def simulate(
+    n_games: int,
+    n_columns: int = 8,
+    n_rows: int = 8,
+    s_to_win: int = 4,
+    players: Sequence[str] = ("A", "B"),
+    policies: Sequence[Policy] = ("random", "random"),
+    seed: int = 0,
+    workers: Optional[int] = None,  # None = os.cpu_count(), 1 = run in this process
+) -> SimResult:
+    if len(policies) != len(players):
+        raise ValueError("Need exactly 1 policy per player")
+    players, policies = tuple(players), tuple(policies)
+    size = _chunk_size(n_games, workers)
+    # game i always uses seed + i, so the results don't depend on the number of workers
+    chunks = [
+        (n_columns, n_rows, s_to_win, players, policies, range(seed + i, seed + min(i + size, n_games)))
+        for i in range(0, n_games, size)
+    ]
+    return _run_chunks(_play_chunk, chunks, players, workers)
+
+
+def replay(
+    games: Sequence[Sequence[int]],
+    n_columns: int = 8,
+    n_rows: int = 8,
+    s_to_win: int = 4,
+    players: Sequence[str] = ("A", "B"),
+    workers: Optional[int] = None,
+) -> SimResult:
+    players = tuple(players)
+    size = _chunk_size(len(games), workers)
+    chunks = [
+        (n_columns, n_rows, s_to_win, players, games[i : i + size])
+        for i in range(0, len(games), size)
+    ]
+    return _run_chunks(_replay_chunk, chunks, players, workers)
+
+
+if __name__ == "__main__":
+    N_GAMES = 2000
+    for policies in [("random", "random"), ("greedy", "random")]:
+        start = time.perf_counter()
+        result = simulate(N_GAMES, policies=policies, seed=42)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{policies}: {N_GAMES / elapsed:.0f} games/s, "
+            f"mean length {result.mean_length():.1f}, {result.summary()}"
+        )
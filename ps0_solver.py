@@ -0,0 +1,313 @@
+"""
+Computer player for the connect N game in ps0.py.
+Iterative deepening alpha-beta (negamax) with move ordering, Zobrist hashing and a fixed size
+transposition table, under a time budget per move. 2 players only.
+
+Stage 1 = make/unmake on top of Board.drop()/Board.undo(), with an incrementally updated Zobrist hash
+Stage 2 = negamax + alpha-beta + transposition table
+Stage 3 = iterative deepening with a time budget, and a nodes/s benchmark
+"""
+
+# Zobrist hashing when chips enter from the bottom:
+# every drop pushes the whole column up, so hashing (column, height, player) would need O(height) xors per move.
+# Instead hash (column, ordinal, player), where ordinal = how many chips were already in the column when it was dropped.
+# The chips in a column are always in reverse drop order, so the ordinals + players pin down the column exactly,
+# and make/unmake is a single xor.
+
+# Transposition table: parallel arrays indexed by hash & (size - 1), one entry per slot.
+# Replacement: always replace entries from an older search, otherwise keep whichever was searched deeper.
+
+import random
+import time
+from array import array
+from typing import List, Optional, Tuple
+
+from ps0 import Board
+
+WIN = 1_000_000  # win in `ply` moves scores WIN - ply, so faster wins are preferred
+WIN_BOUND = WIN - 100_000  # anything above this is a forced win/loss
+MAX_DEPTH = 0x7FFF  # most the transposition table's depth entries (array("h")) can hold
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class _Timeout(Exception):
+    pass
+
+
+class Solver:
+    def __init__(self, board: Board, tt_bits: int = 20, seed: int = 0):
+        if len(board.players) != 2:
+            raise ValueError("Solver only supports 2 players")
+        self.board = board
+        rng = random.Random(seed)
+        n_players = len(board.players)
+        # 63 bits so the keys fit in array("q")
+        self.zobrist = [
+            rng.getrandbits(63)
+            for _ in range(board.n_columns * board.n_rows * n_players)
+        ]
+        self.zobrist_side = rng.getrandbits(63)
+        self.player_idx = {p: i for i, p in enumerate(board.players)}
+        self.hash = self.compute_hash()
+
+        self.tt_size = 1 << tt_bits
+        self.tt_keys = array("q", [0]) * self.tt_size
+        self.tt_scores = array("i", [0]) * self.tt_size
+        self.tt_depths = array("h", [-1]) * self.tt_size  # -1 = empty slot
+        self.tt_flags = array("b", [0]) * self.tt_size
+        self.tt_moves = array("i", [-1]) * self.tt_size
+        self.tt_ages = array("H", [0]) * self.tt_size
+        self.age = 0
+
+        # centre columns first, they take part in the most lines
+        centre = (board.n_columns - 1) / 2
+        self.centre_order = sorted(range(board.n_columns), key=lambda c: abs(c - centre))
+        self.killers = []  # per ply, last 2 moves that caused a beta cutoff
+        self.nodes = 0
+        self.deadline = None
+        self.root_move = -1
+
+    def _key(self, column_idx: int, ordinal: int, player: str) -> int:
+        n_players = len(self.board.players)
+        idx = (column_idx * self.board.n_rows + ordinal) * n_players
+        return self.zobrist[idx + self.player_idx[player]]
+
+    def compute_hash(self) -> int:
+        # Full recompute from the board, only needed once (the search keeps it updated with make/unmake).
+        board = self.board
+        h = self.zobrist_side if board.current_turn == board.players[1] else 0
+        for column_idx in range(board.n_columns):
+            column = board.slots(column_idx)  # bottom first = most recent drop first
+            height = board.heights[column_idx]
+            for pos in range(height):
+                h ^= self._key(column_idx, height - 1 - pos, column[pos])
+        return h
+
+    # Make / unmake: no printing, no validation, just Board.drop()/undo() + the hash + switching turns
+    def make(self, column_idx: int):
+        board = self.board
+        self.hash ^= self._key(column_idx, board.heights[column_idx], board.current_turn)
+        board.drop(column_idx)
+        board.next_player()
+        self.hash ^= self.zobrist_side
+
+    def unmake(self):
+        board = self.board
+        board.next_player()  # 2 players, so next == previous
+        self.hash ^= self.zobrist_side
+        column_idx = board.undo()
+        self.hash ^= self._key(column_idx, board.heights[column_idx], board.current_turn)
+
+    # Static evaluation, from the point of view of the player to move
+    def evaluate(self) -> int:
+        board = self.board
+        me = board.current_turn
+        score = 0
+        for player, bitboard in board.bitboards.items():
+            sign = 1 if player == me else -1
+            for shift in (1, board.stride, board.stride + 1, board.stride - 1):
+                run = bitboard
+                # weight runs of k chips by 4^k, a run of s - 1 is worth a lot more than 2 runs of s - 2
+                for k in range(1, board.to_win - 1):
+                    run &= bitboard >> (k * shift)
+                    if not run:
+                        break
+                    score += sign * (4 ** k) * run.bit_count()
+        return score
+
+    def candidate_moves(self) -> List[int]:
+        # On big boards, only columns within s - 1 of a chip can take part in a line with it, so ignore the rest.
+        board = self.board
+        near = [False] * board.n_columns
+        reach = board.to_win - 1
+        any_chips = False
+        for column_idx, height in enumerate(board.heights):
+            if height:
+                any_chips = True
+                for c in range(max(0, column_idx - reach), min(board.n_columns, column_idx + reach + 1)):
+                    near[c] = True
+        if not any_chips:
+            return [self.centre_order[0]]
+        return [c for c in self.centre_order if near[c] and board.is_avail(c)]
+
+    def ordered_moves(self, tt_move: int, ply: int) -> List[int]:
+        moves = self.candidate_moves()
+        first = []
+        if tt_move in moves:
+            first.append(tt_move)
+        if ply < len(self.killers):
+            for killer in self.killers[ply]:
+                if killer in moves and killer not in first:
+                    first.append(killer)
+        if not first:
+            return moves
+        return first + [c for c in moves if c not in first]
+
+    def _store_killer(self, ply: int, column_idx: int):
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if column_idx not in killers:
+            killers.insert(0, column_idx)
+            del killers[2:]
+
+    def _tt_store(self, depth: int, score: int, flag: int, move: int, ply: int):
+        # mate scores are stored relative to this node, so they stay valid when reached at another ply
+        if score > WIN_BOUND:
+            score += ply
+        elif score < -WIN_BOUND:
+            score -= ply
+        slot = self.hash & (self.tt_size - 1)
+        if (
+            self.tt_depths[slot] < 0
+            or self.tt_ages[slot] != self.age
+            or self.tt_keys[slot] == self.hash
+            or depth >= self.tt_depths[slot]
+        ):
+            self.tt_keys[slot] = self.hash
+            self.tt_scores[slot] = score
+            self.tt_depths[slot] = depth
+            self.tt_flags[slot] = flag
+            self.tt_moves[slot] = move
+            self.tt_ages[slot] = self.age
+
+    def negamax(self, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if self.nodes & 255 == 0 and time.perf_counter() > self.deadline:
+            raise _Timeout
+
+        board = self.board
+        if not board.slots_avail():
+            return 0
+        if depth == 0:
+            return self.evaluate()
+
+        alpha_orig = alpha
+        tt_move = -1
+        slot = self.hash & (self.tt_size - 1)
+        if self.tt_depths[slot] >= 0 and self.tt_keys[slot] == self.hash:
+            tt_move = self.tt_moves[slot]
+            if self.tt_depths[slot] >= depth:
+                score = self.tt_scores[slot]
+                if score > WIN_BOUND:
+                    score -= ply
+                elif score < -WIN_BOUND:
+                    score += ply
+                flag = self.tt_flags[slot]
+                if flag == EXACT:
+                    if ply == 0:
+                        self.root_move = tt_move  # the root has a full window, so only an exact entry can cut it off
+                    return score
+                if flag == LOWER and score >= beta:
+                    return score
+                if flag == UPPER and score <= alpha:
+                    return score
+
+        mover = board.current_turn
+        best_score = -WIN - 1
+        best_move = -1
+        for column_idx in self.ordered_moves(tt_move, ply):
+            self.make(column_idx)
+            winners = board.check_last_move_win(column_idx)
+            if winners:
+                if len(winners) > 1:
+                    score = 0  # both players completed a line, call it a draw
+                elif winners[0] == mover:
+                    score = WIN - ply - 1
+                else:
+                    score = -(WIN - ply - 1)  # pushed the column up into a line for the opponent
+            else:
+                score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            self.unmake()
+
+            if score > best_score:
+                best_score = score
+                best_move = column_idx
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self._store_killer(ply, column_idx)
+                break
+
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self._tt_store(depth, best_score, flag, best_move, ply)
+        if ply == 0:
+            self.root_move = best_move
+        return best_score
+
+    def search(
+        self, time_budget: float = 1.0, max_depth: Optional[int] = None
+    ) -> Tuple[int, int, int]:
+        # Returns (best column, score, depth of the last fully searched iteration).
+        # If time runs out halfway through a depth, the result of the previous depth is used.
+        board = self.board
+        if not board.slots_avail():
+            raise ValueError("Board is full")
+        max_depth = max_depth or board.n_columns * board.n_rows - board.n_chips
+        self.deadline = time.perf_counter() + time_budget
+        self.age = (self.age + 1) & 0xFFFF
+        self.killers = []
+
+        # the board may have been played on since the last search, so don't trust the old hash
+        self.hash = self.compute_hash()
+        n_history = len(board.history)
+        root_hash, root_turn = self.hash, board.current_turn
+        best_move, best_score, best_depth = self.candidate_moves()[0], 0, 0
+        try:
+            for depth in range(1, min(max_depth, MAX_DEPTH) + 1):
+                score = self.negamax(depth, -WIN - 1, WIN + 1, 0)
+                best_move, best_score, best_depth = self.root_move, score, depth
+                if abs(score) > WIN_BOUND:
+                    break  # forced result found, searching deeper won't change it
+        except _Timeout:
+            # unwind whatever the search had made on the board
+            while len(board.history) > n_history:
+                board.undo()
+            self.hash, board.current_turn = root_hash, root_turn
+        return best_move, best_score, best_depth
+
+
+def best_move(board: Board, time_budget: float = 1.0) -> int:
+    return Solver(board).search(time_budget)[0]
+
+
+def benchmark(time_budget: float = 2.0):
+    configs = [
+        # (columns, rows, to_win, random opening moves)
+        (7, 6, 4, 0),
+        (8, 8, 4, 6),
+        (500, 500, 6, 10),
+    ]
+    rng = random.Random(0)
+    for n_columns, n_rows, to_win, n_opening in configs:
+        board = Board(["A", "B"], n_columns, n_rows, "A", to_win)
+        centre = n_columns // 2
+        while board.n_chips < n_opening:  # random opening around the centre so the position isn't trivial
+            column_idx = min(n_columns - 1, max(0, centre + rng.randint(-4, 4)))
+            board.drop(column_idx)
+            if board.check_last_move_win(column_idx):
+                board.undo()  # don't hand the solver a finished game
+                continue
+            board.next_player()
+        start = time.perf_counter()
+        solver = Solver(board)
+        setup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        move, score, depth = solver.search(time_budget)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{n_columns}x{n_rows} connect {to_win}: move {move}, score {score}, depth {depth}, "
+            f"{solver.nodes} nodes in {elapsed:.2f}s = {solver.nodes / elapsed:.0f} nodes/s "
+            f"(setup {setup:.2f}s)"
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
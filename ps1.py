@@ -2,27 +2,7 @@
 Imagine you're building a system to run data processing jobs. These jobs have dependencies; for example, a 'transform' job can't run until an 'extract' job is finished. You're given a set of these jobs and their dependencies. How would you design a program to determine if this workflow can actually run to completion, or if it's stuck in a deadlock?
 """
 
-jobs = {
-    "a": [],
-    "b": [],
-    "c": ["a"],
-    "d": ["b"],
-    "e": ["d", "c"],
-    "f": ["c"],
-    "g": ["e", "f"],
-    # "a": ["f"],  # force cyclic
-}
-
-job_durations = {
-    "a": 5,
-    "b": 3,
-    "c": 2,
-    "d": 1,
-    "e": 8,
-    "f": 3,
-    "g": 4,
-    # "a": ["f"],  # force cyclic
-}
+from ps1_data import job_durations, jobs
 
 # Could not solve this question ):
 # This is a DAG topological sort
@@ -109,6 +89,7 @@ else:
 # Critical Path Analysis: https://www.youtube.com/watch?v=4oDLMs11Exs
 
 # Gemini provided Critical Path Algo!n Study this again:
+# (implemented for real, with the k machine schedule, in ps1_scheduler.py)
 
 # def find_critical_path(jobs, job_durations):
 #     """
@@ -0,0 +1,25 @@
+"""
+Sample workflow for ps1.py and the ps1_* demos, on its own so they can use it without running ps1.py's module level code.
+"""
+
+jobs = {
+    "a": [],
+    "b": [],
+    "c": ["a"],
+    "d": ["b"],
+    "e": ["d", "c"],
+    "f": ["c"],
+    "g": ["e", "f"],
+    # "a": ["f"],  # force cyclic
+}
+
+job_durations = {
+    "a": 5,
+    "b": 3,
+    "c": 2,
+    "d": 1,
+    "e": 8,
+    "f": 3,
+    "g": 4,
+    # "a": ["f"],  # force cyclic
+}
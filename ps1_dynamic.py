@@ -0,0 +1,162 @@
+"""
+Live editable version of the ps1 workflow: jobs and dependencies are added/removed one at a time
+and we keep a valid topological order the whole time, without re-running Kahn's over everything.
+
+Uses the Pearce-Kelly algorithm. Every job has a position in the current order.
+Adding dep --> job only needs work when the dep is currently ordered after the job. In that case:
+  1. DFS forward from job, only visiting jobs positioned up to dep. Reaching dep means the new edge closes a cycle,
+     so the edge is rejected (CycleError with the cycle path) and nothing changes.
+  2. DFS backward from dep, only visiting jobs positioned from job onwards.
+  3. Give the jobs found in (2) then (1) the same set of positions they already had, in that order.
+Only the jobs between the 2 positions can be touched, so most edits are much cheaper than a full re-sort.
+Removing a dependency can never break a topological order, so that's O(1).
+"""
+
+from typing import Dict, Iterable, List
+
+from ps1_graph import CycleError, JobGraph
+
+
+class DynamicJobGraph:
+    def __init__(self):
+        self.names = []  # job id --> name
+        self.index = {}  # name --> job id
+        self.succ = []  # job id --> set of job ids that depend on it
+        self.pred = []  # job id --> set of job ids it depends on
+        self.position = []  # job id --> position in the topological order
+        self.node_at = []  # position --> job id
+
+    @classmethod
+    def from_jobs(cls, jobs: Dict[str, List[str]]) -> "DynamicJobGraph":
+        # Initial load sorts once with JobGraph (raises CycleError if it's already deadlocked), after that it's incremental.
+        graph = JobGraph.from_jobs(jobs)
+        dynamic = cls()
+        for j in graph.topological_order():
+            dynamic.add_job(graph.name_of(j))
+        for job, deps in jobs.items():
+            for dep in deps:
+                dynamic.add_dependency(job, dep)  # already in order, so no reordering happens here
+        return dynamic
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name) -> bool:
+        return name in self.index
+
+    def add_job(self, name: str, deps: Iterable[str] = ()) -> int:
+        # Raises CycleError (and leaves the graph unchanged) if any of deps would close a loop
+        j = self.index.get(name)
+        deps = list(deps)
+        if name in deps:
+            raise CycleError([name, name])
+        if j is not None:
+            # check every new dependency before adding any: each one on its own is enough, a loop through 2 of the new
+            # edges would have to pass through this job twice
+            for dep in deps:
+                x = self.index.get(dep)
+                if x is not None and j not in self.succ[x] and self.position[j] < self.position[x]:
+                    self._forward(j, self.position[x], x)
+        if j is None:
+            # a new job has no edges yet, so it can go at the end of the order
+            j = len(self.names)
+            self.names.append(name)
+            self.index[name] = j
+            self.succ.append(set())
+            self.pred.append(set())
+            self.position.append(j)
+            self.node_at.append(j)
+        for dep in deps:
+            self.add_dependency(name, dep)
+        return j
+
+    def add_dependency(self, job: str, dep: str):
+        # job depends on dep, i.e. dep --> job. Raises CycleError (and leaves the graph unchanged) if that closes a loop.
+        # A new job can't close one (nothing depends on it yet), so only the self loop needs checking before they're added
+        if job == dep:
+            raise CycleError([dep, dep])
+        x = self.add_job(dep)
+        y = self.add_job(job)
+        if y in self.succ[x]:
+            return
+
+        lower, upper = self.position[y], self.position[x]
+        if lower < upper:  # job is currently ordered before dep, so part of the order has to move
+            forward = self._forward(y, upper, x)
+            backward = self._backward(x, lower)
+            self._reorder(backward, forward)
+        self.succ[x].add(y)
+        self.pred[y].add(x)
+
+    def remove_dependency(self, job: str, dep: str):
+        x, y = self.index[dep], self.index[job]
+        self.succ[x].discard(y)
+        self.pred[y].discard(x)
+
+    def dependencies(self, job: str) -> List[str]:
+        return [self.names[d] for d in self.pred[self.index[job]]]
+
+    def _forward(self, start: int, upper: int, target: int) -> List[int]:
+        # Everything reachable from start that is positioned <= upper. Hitting target means a cycle.
+        position = self.position
+        parent = {start: None}
+        stack = [start]
+        while stack:
+            j = stack.pop()
+            for t in self.succ[j]:
+                if t == target:
+                    chain = [j]
+                    while parent[j] is not None:
+                        j = parent[j]
+                        chain.append(j)
+                    chain.reverse()  # start --> ... --> the job that leads back to target
+                    cycle = [target] + chain + [target]
+                    raise CycleError([self.names[c] for c in cycle])
+                if t not in parent and position[t] <= upper:
+                    parent[t] = j
+                    stack.append(t)
+        return list(parent)
+
+    def _backward(self, start: int, lower: int) -> List[int]:
+        # Everything that can reach start and is positioned >= lower
+        position = self.position
+        seen = {start}
+        stack = [start]
+        while stack:
+            j = stack.pop()
+            for p in self.pred[j]:
+                if p not in seen and position[p] >= lower:
+                    seen.add(p)
+                    stack.append(p)
+        return list(seen)
+
+    def _reorder(self, backward: List[int], forward: List[int]):
+        # Reuse the same positions, but put everything that leads into dep before everything that comes after job.
+        position = self.position
+        backward.sort(key=lambda j: position[j])
+        forward.sort(key=lambda j: position[j])
+        jobs = backward + forward
+        positions = sorted(position[j] for j in jobs)
+        for j, p in zip(jobs, positions):
+            position[j] = p
+            self.node_at[p] = j
+
+    def topological_order(self) -> List[str]:
+        return [self.names[j] for j in self.node_at]
+
+
+if __name__ == "__main__":
+    from ps1_data import jobs
+
+    workflow = DynamicJobGraph.from_jobs(jobs)
+    print(workflow.topological_order())
+
+    workflow.add_job("h", deps=["g"])
+    workflow.add_dependency("b", "h2")  # new job h2 has to run before b now
+    print(workflow.topological_order())
+
+    try:
+        workflow.add_dependency("a", "f")  # same as the commented out "force cyclic" line in ps1_data.py
+    except CycleError as e:
+        print(f"rejected: {e.cycle}")
+    print(workflow.topological_order())
@@ -0,0 +1,188 @@
+"""
+Actually run the ps1 workflow instead of popping names off a deque.
+Same `jobs` (job: [deps]) dict as ps1.py, plus `tasks` mapping each job to what it runs:
+    - an async callable (called with no args), or
+    - a command: list of args for create_subprocess_exec, or a str for create_subprocess_shell
+
+A job starts as soon as all its deps have succeeded (in-degree hits 0) and a slot is free, at most k at a time.
+Each job can have a timeout. If a job fails / times out, everything downstream of it is cancelled
+(it never gets launched), while unrelated branches keep running.
+Real start/finish times are recorded so they can be compared with the critical path estimate from ps1_scheduler.
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import time
+from array import array
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Union
+
+from ps1_graph import JobGraph
+from ps1_scheduler import critical_path_analysis
+
+Task = Union[Callable[[], Awaitable], Sequence[str], str]
+
+SUCCESS = "success"
+FAILED = "failed"
+TIMEOUT = "timeout"
+CANCELLED = "cancelled"  # never ran, because something upstream failed
+
+
+class JobResult:
+    def __init__(self, name, status, start=None, finish=None, error=None):
+        self.name = name
+        self.status = status
+        self.start = start  # seconds since the workflow started
+        self.finish = finish
+        self.error = error
+
+    def __repr__(self):
+        return f"JobResult({self.name!r}, {self.status}, start={self.start}, finish={self.finish})"
+
+
+async def _run_command(cmd: Union[Sequence[str], str]):
+    # Each command gets its own process group, so killing it also kills whatever it started
+    # (a shell's children, or a script's subprocesses), not just the process we launched.
+    if isinstance(cmd, str):
+        proc = await asyncio.create_subprocess_shell(cmd, start_new_session=True)
+    else:
+        proc = await asyncio.create_subprocess_exec(*cmd, start_new_session=True)
+    try:
+        returncode = await proc.wait()
+    except asyncio.CancelledError:  # timed out / workflow cancelled, don't leave anything running
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass  # the whole group already exited
+        await proc.wait()
+        raise
+    if returncode != 0:
+        raise RuntimeError(f"command exited with code {returncode}")
+
+
+async def _run_job(name: str, task: Task, timeout: Optional[float], t0: float, starts: dict):
+    # Times are taken inside the task, so waiting for a free slot doesn't count.
+    # The start goes into `starts` straight away so it is still known if the job fails.
+    starts[name] = time.monotonic() - t0
+    coro = task() if callable(task) else _run_command(task)
+    await asyncio.wait_for(coro, timeout)
+    return time.monotonic() - t0
+
+
+async def run_workflow(
+    jobs: Dict[str, List[str]],
+    tasks: Dict[str, Task],
+    k: int = 4,
+    timeout: Optional[float] = None,  # default per job timeout in seconds
+    timeouts: Optional[Dict[str, float]] = None,  # per job overrides
+) -> Dict[str, JobResult]:
+    if k < 1:
+        raise ValueError("Need at least 1 slot")
+    graph = JobGraph.from_jobs(jobs)
+    graph.topological_order()  # raises CycleError before anything runs
+    missing = [name for name in graph.names if name not in tasks]
+    if missing:
+        raise KeyError(f"No task for jobs: {missing}")
+    timeouts = timeouts or {}
+
+    in_degree = array("i", graph.in_degree)
+    ready = deque(j for j in range(graph.n_jobs) if in_degree[j] == 0)
+    running = {}  # asyncio task --> job id
+    results = {}
+    starts = {}
+    t0 = time.monotonic()
+    try:
+        while ready or running:
+            while ready and len(running) < k:
+                j = ready.popleft()
+                name = graph.name_of(j)
+                job_timeout = timeouts.get(name, timeout)
+                task = _run_job(name, tasks[name], job_timeout, t0, starts)
+                running[asyncio.create_task(task)] = j
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for finished in done:
+                j = running.pop(finished)
+                name = graph.name_of(j)
+                start = starts.get(name)
+                try:
+                    finish = finished.result()
+                except asyncio.TimeoutError as e:
+                    results[name] = JobResult(name, TIMEOUT, start, time.monotonic() - t0, e)
+                    continue
+                except asyncio.CancelledError as e:
+                    # the job's task was cancelled from inside (we only cancel in the finally below), treat it as a
+                    # failure of that job instead of letting it cancel the whole workflow
+                    results[name] = JobResult(name, FAILED, start, time.monotonic() - t0, e)
+                    continue
+                except Exception as e:
+                    results[name] = JobResult(name, FAILED, start, time.monotonic() - t0, e)
+                    continue
+                results[name] = JobResult(name, SUCCESS, start, finish)
+                for t in graph.successors(j):
+                    in_degree[t] -= 1
+                    if in_degree[t] == 0:
+                        ready.append(t)
+    finally:
+        for task in running:  # only non-empty if we were cancelled / errored ourselves
+            task.cancel()
+        # let them run their cleanup (e.g. killing their processes) before we return or raise
+        await asyncio.gather(*running, return_exceptions=True)
+
+    # Anything downstream of a failure never got to in-degree 0, so it was never launched
+    for name in graph.names:
+        if name not in results:
+            results[name] = JobResult(name, CANCELLED)
+    return results
+
+
+def run(jobs, tasks, **kwargs) -> Dict[str, JobResult]:
+    return asyncio.run(run_workflow(jobs, tasks, **kwargs))
+
+
+def compare_with_estimate(
+    results: Dict[str, JobResult],
+    jobs: Dict[str, List[str]],
+    job_durations: Dict[str, float],
+    time_unit: float = 1.0,  # seconds per unit of job_durations
+):
+    # Print the real start/finish next to the critical path estimate (with unlimited machines)
+    graph = JobGraph.from_jobs(jobs)
+    cpa = critical_path_analysis(graph, graph.durations_array(job_durations))
+    print(f"{'job':>10} {'status':>10} {'est start':>10} {'start':>8} {'est end':>8} {'end':>8}")
+    for j in range(graph.n_jobs):
+        name = graph.name_of(j)
+        r = results[name]
+        start = f"{r.start / time_unit:.2f}" if r.start is not None else "-"
+        finish = f"{r.finish / time_unit:.2f}" if r.finish is not None else "-"
+        print(
+            f"{name:>10} {r.status:>10} {cpa.es[j]:>10} {start:>8} {cpa.ef[j]:>8} {finish:>8}"
+        )
+    finishes = [r.finish for r in results.values() if r.finish is not None]
+    actual = max(finishes) / time_unit if finishes else 0
+    print(f"estimated duration {cpa.project_duration}, actual {actual:.2f}")
+
+
+if __name__ == "__main__":
+    from ps1_data import jobs, job_durations
+
+    UNIT = 0.1  # seconds per duration unit, so the demo doesn't take forever
+
+    def sleeper(seconds):
+        async def task():
+            await asyncio.sleep(seconds)
+
+        return task
+
+    tasks = {name: sleeper(d * UNIT) for name, d in job_durations.items()}
+    results = run(jobs, tasks, k=2)
+    compare_with_estimate(results, jobs, job_durations, UNIT)
+
+    # c fails as a subprocess and d times out, so e, f and g are cancelled (b is unaffected)
+    tasks["c"] = [sys.executable, "-c", "raise SystemExit(1)"]
+    tasks["d"] = "sleep 5"
+    results = run(jobs, tasks, k=2, timeouts={"d": 0.5})
+    for r in results.values():
+        print(r, r.error or "")
@@ -0,0 +1,196 @@
+"""
+Compact job dependency graph for ps1.
+Same information as `graph = defaultdict(list)` + `in_degree = defaultdict(int)` in ps1.py,
+but jobs are interned to integer ids and the edges are stored CSR style in flat arrays:
+
+    successors of job j = targets[offsets[j]:offsets[j + 1]]
+    in_degree[j]        = number of jobs j depends on
+
+That's ~4 bytes per edge + ~8 bytes per job (+ the name strings, if there are any)
+instead of a dict entry, a list object and a boxed int per job and a list slot per edge.
+"""
+
+import sys
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class CycleError(ValueError):
+    # Raised when the workflow is deadlocked, .cycle is the list of job names going round the loop
+    def __init__(self, cycle: List):
+        self.cycle = cycle
+        super().__init__(f"Workflow is deadlocked, cycle: {' -> '.join(map(str, cycle))}")
+
+
+class JobGraph:
+    def __init__(
+        self,
+        n_jobs: int,
+        offsets: array,
+        targets: array,
+        in_degree: array,
+        names: Optional[List[str]] = None,
+    ):
+        self.n_jobs = n_jobs
+        self.offsets = offsets
+        self.targets = targets
+        self.in_degree = in_degree
+        # names[j] is the name of job j. If None, jobs are just known by their ids (e.g. generated graphs)
+        self.names = names
+        self.index = {name: j for j, name in enumerate(names)} if names is not None else None
+
+    @classmethod
+    def from_edges(
+        cls,
+        n_jobs: int,
+        src: Sequence[int],
+        dst: Sequence[int],
+        names: Optional[List[str]] = None,
+    ) -> "JobGraph":
+        # src[i] --> dst[i] means dst[i] depends on src[i]
+        offsets = array("i" if len(src) < 2**31 else "q", [0]) * (n_jobs + 1)
+        in_degree = array("i", [0]) * n_jobs
+        for s in src:
+            offsets[s + 1] += 1
+        for d in dst:
+            in_degree[d] += 1
+        for j in range(n_jobs):
+            offsets[j + 1] += offsets[j]
+        fill = offsets[:-1]  # next free position for each job
+        targets = array("i", [0]) * len(src)
+        for s, d in zip(src, dst):
+            targets[fill[s]] = d
+            fill[s] += 1
+        return cls(n_jobs, offsets, targets, in_degree, names)
+
+    @classmethod
+    def from_jobs(cls, jobs: Dict[str, List[str]]) -> "JobGraph":
+        # jobs = {job: [deps]} like ps1.py. Deps that are not jobs themselves get added as jobs with no deps.
+        names = [sys.intern(name) for name in jobs]
+        index = {name: j for j, name in enumerate(names)}
+        src, dst = array("i"), array("i")
+        for job, deps in jobs.items():
+            j = index[job]
+            for dep in deps:
+                d = index.get(dep)
+                if d is None:
+                    d = index[dep] = len(names)
+                    names.append(sys.intern(dep))
+                src.append(d)  # dep > job, same direction as graph[dep].append(job) in ps1.py
+                dst.append(j)
+        return cls.from_edges(len(names), src, dst, names)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.targets)
+
+    def nbytes(self) -> int:
+        # Size of the arrays only (not the names)
+        return sum(
+            a.itemsize * len(a) for a in (self.offsets, self.targets, self.in_degree)
+        )
+
+    def id_of(self, name) -> int:
+        return self.index[name] if self.index is not None else name
+
+    def name_of(self, j: int):
+        return self.names[j] if self.names is not None else j
+
+    def successors(self, j: int) -> array:
+        return self.targets[self.offsets[j] : self.offsets[j + 1]]
+
+    def topological_order(self) -> array:
+        # Kahn's algorithm, same as ps1.py but on a copy of the in-degree array. Raises CycleError on deadlock.
+        offsets, targets = self.offsets, self.targets
+        in_degree = array("i", self.in_degree)
+        order = array("i", [j for j in range(self.n_jobs) if in_degree[j] == 0])
+        head = 0
+        while head < len(order):
+            j = order[head]
+            head += 1
+            for t in targets[offsets[j] : offsets[j + 1]]:
+                in_degree[t] -= 1
+                if in_degree[t] == 0:
+                    order.append(t)
+        if len(order) != self.n_jobs:
+            # whatever still has in-degree > 0 is in a cycle or downstream of one
+            stuck = [j for j in range(self.n_jobs) if in_degree[j] > 0]
+            raise CycleError([self.name_of(j) for j in self.find_cycle(stuck)])
+        return order
+
+    def has_cycle(self) -> bool:
+        try:
+            self.topological_order()
+        except CycleError:
+            return True
+        return False
+
+    def find_cycle(self, start_from: Optional[Sequence[int]] = None) -> List[int]:
+        # Iterative DFS (no recursion limit on deep graphs). A successor that is still on the stack closes a cycle.
+        # Returns the job ids in the cycle, first job repeated at the end, or [] if there is none.
+        offsets, targets = self.offsets, self.targets
+        state = bytearray(self.n_jobs)  # 0 = not visited, 1 = on the stack, 2 = done
+        roots = range(self.n_jobs) if start_from is None else start_from
+        for root in roots:
+            if state[root]:
+                continue
+            state[root] = 1
+            path = [root]
+            stack = [offsets[root]]  # next edge to try for each job on the path
+            while path:
+                j = path[-1]
+                pos = stack[-1]
+                if pos == offsets[j + 1]:
+                    state[j] = 2
+                    path.pop()
+                    stack.pop()
+                    continue
+                stack[-1] = pos + 1
+                t = targets[pos]
+                if state[t] == 1:
+                    return path[path.index(t) :] + [t]
+                if state[t] == 0:
+                    state[t] = 1
+                    path.append(t)
+                    stack.append(offsets[t])
+        return []
+
+    def forward_pass(self, durations: Sequence, order: Optional[array] = None) -> Tuple[array, array]:
+        # Earliest start / finish for every job: push each job's finish time onto its successors' start times
+        offsets, targets = self.offsets, self.targets
+        if order is None:
+            order = self.topological_order()
+        typecode = typecode_for(durations)
+        es = array(typecode, [0]) * self.n_jobs
+        ef = array(typecode, [0]) * self.n_jobs
+        for j in order:
+            finish = es[j] + durations[j]
+            ef[j] = finish
+            for t in targets[offsets[j] : offsets[j + 1]]:
+                if es[t] < finish:
+                    es[t] = finish
+        return es, ef
+
+    def durations_array(self, job_durations: Dict[str, float]) -> array:
+        durations = [job_durations[self.name_of(j)] for j in range(self.n_jobs)]
+        return array(typecode_for(durations), durations)
+
+
+def typecode_for(durations) -> str:
+    if isinstance(durations, array):
+        return durations.typecode
+    return "q" if all(isinstance(d, int) for d in durations) else "d"
+
+
+if __name__ == "__main__":
+    from ps1_data import jobs
+
+    graph = JobGraph.from_jobs(jobs)
+    print([graph.name_of(j) for j in graph.topological_order()])
+    print(f"{graph.n_jobs} jobs, {graph.n_edges} edges, {graph.nbytes()} bytes of arrays")
+
+    cyclic = dict(jobs, a=["f"])  # same as the commented out "force cyclic" line in ps1_data.py
+    try:
+        JobGraph.from_jobs(cyclic).topological_order()
+    except CycleError as e:
+        print(e)
@@ -0,0 +1,236 @@
+"""
+Level 3 of ps1 as a real module: critical path analysis + a k machine schedule for the job DAG.
+Takes the same `jobs` (job: [deps]) / `job_durations` inputs as ps1.py.
+
+- earliest/latest start + finish and slack for every job (forward + backward pass)
+- the critical path
+- a k machine schedule from list scheduling: whenever a machine is free, run the ready job with the
+  longest remaining path (its own duration + the longest chain of jobs after it)
+
+Finding the true shortest k machine makespan is NP-hard, so the list schedule is a heuristic.
+max(critical path, total work / k) is reported as the lower bound to compare it against.
+"""
+
+# Everything runs on the integer ids + CSR arrays of ps1_graph.JobGraph instead of dict-of-lists,
+# and es/ef/ls/lf/slack are arrays indexed by job id. Names only come back in at the very end.
+# Every pass is still a python loop over those arrays: ~2.5-3s per 1M edges end to end (build + both passes + schedule),
+# so 1M jobs / 10M edges takes ~30s, not seconds. `bench` defaults to 100k jobs / 1M edges.
+
+import heapq
+import random
+import sys
+import time
+from array import array
+from typing import Dict, List, Tuple
+
+from ps1_graph import JobGraph, typecode_for
+
+
+class CriticalPath:
+    def __init__(self, graph, es, ef, ls, lf, bottom_level, project_duration, path):
+        self.graph = graph
+        self.es = es  # earliest start
+        self.ef = ef  # earliest finish
+        self.ls = ls  # latest start
+        self.lf = lf  # latest finish
+        self.bottom_level = bottom_level  # longest remaining path, including the job itself
+        self.project_duration = project_duration
+        self.path = path  # job ids
+
+    def slack(self, j: int):
+        return self.ls[j] - self.es[j]
+
+    @property
+    def critical_path(self) -> List[str]:
+        return [self.graph.name_of(j) for j in self.path]
+
+    def job(self, name: str) -> dict:
+        j = self.graph.id_of(name)
+        return {
+            "es": self.es[j],
+            "ef": self.ef[j],
+            "ls": self.ls[j],
+            "lf": self.lf[j],
+            "slack": self.slack(j),
+        }
+
+
+def critical_path_analysis(graph: JobGraph, durations, order=None) -> CriticalPath:
+    n_jobs = graph.n_jobs
+    offsets, targets = graph.offsets, graph.targets
+    if order is None:
+        order = graph.topological_order()
+    typecode = typecode_for(durations)
+
+    # Forward pass: push each job's finish time onto its successors' start times
+    es, ef = graph.forward_pass(durations, order)
+    project_duration = max(ef) if n_jobs else 0
+
+    # Backward pass: push each job's latest start back onto its predecessors' latest finish,
+    # and the longest chain from each job to the end (bottom level) along with it
+    bottom_level = array(typecode, [0]) * n_jobs
+    ls = array(typecode, [0]) * n_jobs
+    lf = array(typecode, [project_duration]) * n_jobs
+    # float durations: adding up the chain forwards and subtracting it backwards can disagree in the last bits,
+    # so a latest start within rounding of the earliest start is snapped onto it (slack exactly 0, not +-1e-16)
+    tolerance = project_duration * 1e-12 if typecode == "d" else 0
+    for j in reversed(order):
+        longest_after = 0
+        latest_finish = project_duration
+        for t in targets[offsets[j] : offsets[j + 1]]:
+            if bottom_level[t] > longest_after:
+                longest_after = bottom_level[t]
+            if ls[t] < latest_finish:
+                latest_finish = ls[t]
+        bottom_level[j] = durations[j] + longest_after
+        if abs(latest_finish - ef[j]) <= tolerance:
+            lf[j], ls[j] = ef[j], es[j]
+        else:
+            lf[j] = latest_finish
+            ls[j] = latest_finish - durations[j]
+
+    # Walk 1 longest chain: from the start job with the biggest bottom level, keep taking the successor with the
+    # biggest bottom level. No float equality needed, so it works for fractional durations too.
+    path = []
+    in_degree = graph.in_degree
+    current = max(
+        (j for j in order if in_degree[j] == 0), key=lambda j: bottom_level[j], default=None
+    )
+    while current is not None:
+        path.append(current)
+        current = max(
+            targets[offsets[current] : offsets[current + 1]], key=lambda t: bottom_level[t], default=None
+        )
+    return CriticalPath(graph, es, ef, ls, lf, bottom_level, project_duration, path)
+
+
+class MachineSchedule:
+    def __init__(self, graph, k, start, machine, makespan, lower_bound):
+        self.graph = graph
+        self.k = k
+        self.start = start  # start time per job id
+        self.machine = machine  # machine idx per job id
+        self.makespan = makespan
+        self.lower_bound = lower_bound  # max(critical path, total work / k), no schedule can beat this
+
+    def by_machine(self) -> List[List[Tuple[str, float]]]:
+        # [[(job, start), ...] for each machine], in start order
+        machines = [[] for _ in range(self.k)]
+        for j in sorted(range(len(self.start)), key=lambda j: self.start[j]):
+            machines[self.machine[j]].append((self.graph.name_of(j), self.start[j]))
+        return machines
+
+
+def list_schedule(
+    graph: JobGraph, durations, k: int, priority=None
+) -> MachineSchedule:
+    # priority[j] = longest remaining path (bottom level), higher runs first
+    n_jobs = graph.n_jobs
+    offsets, targets = graph.offsets, graph.targets
+    if k < 1:
+        raise ValueError("Need at least 1 machine")
+    if priority is None:
+        priority = critical_path_analysis(graph, durations).bottom_level
+    typecode = typecode_for(durations)
+
+    in_degree = array("i", graph.in_degree)
+    ready = [(-priority[j], j) for j in range(n_jobs) if in_degree[j] == 0]
+    heapq.heapify(ready)
+    free_machines = list(range(k))  # already a valid heap
+    running = []  # (finish time, machine, job)
+    start = array(typecode, [0]) * n_jobs
+    machine = array("i", [0]) * n_jobs
+
+    now = 0
+    done = 0
+    while done < n_jobs:
+        while ready and free_machines:
+            _, j = heapq.heappop(ready)
+            m = heapq.heappop(free_machines)
+            start[j] = now
+            machine[j] = m
+            heapq.heappush(running, (now + durations[j], m, j))
+        if not running:
+            raise ValueError("Workflow is deadlocked: no job can start")
+        # jump to the next finish time and release everything finishing then
+        now = running[0][0]
+        while running and running[0][0] == now:
+            _, m, j = heapq.heappop(running)
+            heapq.heappush(free_machines, m)
+            done += 1
+            for t in targets[offsets[j] : offsets[j + 1]]:
+                in_degree[t] -= 1
+                if in_degree[t] == 0:
+                    heapq.heappush(ready, (-priority[t], t))
+
+    total_work = sum(durations)
+    longest_chain = max(priority) if n_jobs else 0
+    lower_bound = max(longest_chain, total_work / k)
+    return MachineSchedule(graph, k, start, machine, now, lower_bound)
+
+
+def schedule(
+    jobs: Dict[str, List[str]], job_durations: Dict[str, float], k: int
+) -> Tuple[CriticalPath, MachineSchedule]:
+    graph = JobGraph.from_jobs(jobs)
+    durations = graph.durations_array(job_durations)
+    cpa = critical_path_analysis(graph, durations)
+    machines = list_schedule(graph, durations, k, cpa.bottom_level)
+    return cpa, machines
+
+
+def random_dag(n_jobs: int, n_edges: int, seed: int = 0):
+    # Edges always go from a lower id to a higher id, so this is a DAG by construction
+    rng = random.Random(seed)
+    src, dst = array("i"), array("i")
+    randrange = rng.randrange
+    for _ in range(n_edges):
+        a = randrange(n_jobs - 1)
+        b = randrange(a + 1, min(n_jobs, a + 1000))  # keep edges local so the DAG has a long critical path
+        src.append(a)
+        dst.append(b)
+    durations = array("q", [randrange(1, 100) for _ in range(n_jobs)])
+    return src, dst, durations
+
+
+def benchmark(n_jobs: int = 100_000, n_edges: int = 1_000_000, k: int = 64):
+    start = time.perf_counter()
+    src, dst, durations = random_dag(n_jobs, n_edges)
+    print(f"generated {n_jobs} jobs / {n_edges} edges in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    graph = JobGraph.from_edges(n_jobs, src, dst)  # no names, ids are enough here
+    print(
+        f"CSR build:       {time.perf_counter() - start:.1f}s "
+        f"({graph.nbytes() / 1e6:.0f} MB of arrays)"
+    )
+
+    start = time.perf_counter()
+    cpa = critical_path_analysis(graph, durations)
+    print(
+        f"critical path:   {time.perf_counter() - start:.1f}s "
+        f"(duration {cpa.project_duration}, {len(cpa.path)} jobs on the path)"
+    )
+
+    start = time.perf_counter()
+    machines = list_schedule(graph, durations, k, cpa.bottom_level)
+    print(
+        f"{k} machine list schedule: {time.perf_counter() - start:.1f}s "
+        f"(makespan {machines.makespan}, lower bound {machines.lower_bound:.0f})"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
+    else:
+        from ps1_data import jobs, job_durations
+
+        cpa, machines = schedule(jobs, job_durations, k=2)
+        print(f"The critical path is: {cpa.critical_path}")
+        print(f"The total project duration is: {cpa.project_duration}")
+        for name in jobs:
+            print(name, cpa.job(name))
+        print(f"2 machine makespan: {machines.makespan} (lower bound {machines.lower_bound})")
+        for m, assigned in enumerate(machines.by_machine()):
+            print(f"machine {m}: {assigned}")
@@ -17,81 +17,504 @@ Stage 3: To keep the game exciting, the leaderboard needs to be dynamic. It shou
 # Have a player score dictionary which are not sorted
 
 import random
+import sys
 import time
+from bisect import bisect_left, insort
+from collections import deque
 
 
 # Need a function to get_top_k(top_k)
 # Also need a function to update_scoreboard(player_id, score)
 class DynamicScore:
-    score_history: list[(int,int)] # unix_ts, score
+    score_history: deque[(float,int)] # unix_ts, score, oldest on the left
     sum_score_window: int # total score in the time window specified
+    window_seconds: float
     
-    def __init__(self):
-        self.score_history = []
+    base: int # how many entries have been popped off the left so far, so entry i (counting from the very first) is score_history[i - base]
+    
+    def __init__(self, window_seconds: float = 10):
+        self.score_history = deque()
         self.sum_score_window = 0
+        self.window_seconds = window_seconds
+        self.base = 0
     
-    def keep_in_window(self, seconds): # dont want my history togrow monotoncailly
-        oldest_keep = time.time() - seconds # assume 5 minutes 
-        for i,history in enumerate(self.score_history):
-            if history[0] > oldest_keep:
-                break
-        self.score_history = self.score_history[i:] # keep only those in range, may be empty
-        
-    def update_score_history(self, score):
-        self.score_history.append((time.time(), score))
-        self.keep_in_window(10) # in seconds
-        self.sum_score_window = sum([s[1] for s in self.score_history])
+    def keep_in_window(self, now: float = None) -> int: # dont want my history to grow monotonically
+        # Entries are in time order, so only the left end can expire. Pop them and take them off the running sum,
+        # each entry gets popped at most once --> O(1) amortized instead of scanning + re-summing the whole window
+        if now is None:
+            now = time.time()
+        oldest_keep = now - self.window_seconds
+        history = self.score_history
+        while history and history[0][0] <= oldest_keep:
+            self.sum_score_window -= history.popleft()[1]
+            self.base += 1
         return self.sum_score_window
+
+    def add(self, score, now: float):
+        # append without expiring anything yet
+        self.score_history.append((now, score))
+        self.sum_score_window += score
+        
+    def update_score_history(self, score, now: float = None):
+        if now is None:
+            now = time.time()
+        self.add(score, now)
+        return self.keep_in_window(now)
             
         
 
+class TimeWheel:
+    # Players who stop sending events never call update_score_history again, so their window sum would never decay.
+    # Every event schedules its own expiry time here; advance(now) hands back the players who have something expiring,
+    # so only they need to be touched. Slots are `resolution` seconds wide, and there are enough of them to cover
+    # a whole window, so a slot only ever holds players for 1 tick at a time.
+    # Trade-off: an idle player's sum decays up to `resolution` seconds late (players who send events are always exact).
+    # Without `now`, the wheel starts at the first time it is given, so callers passing their own (e.g. historic)
+    # timestamps get the same expiry as a live stream.
+    def __init__(self, window_seconds: float, resolution: float = 1.0, now: float = None):
+        self.window_seconds = window_seconds
+        self.resolution = resolution
+        self.n_slots = int(window_seconds / resolution) + 3
+        self.slots = [set() for _ in range(self.n_slots)]
+        self.current_tick = None if now is None else int(now / resolution)
+
+    def schedule(self, player_id, expires_at: float):
+        if self.current_tick is None:
+            self.current_tick = int((expires_at - self.window_seconds) / self.resolution)
+        # +1 so the slot is only processed once `now` is strictly past expires_at
+        tick = max(int(expires_at / self.resolution) + 1, self.current_tick + 1)
+        self.slots[tick % self.n_slots].add(player_id)
+
+    def advance(self, now: float) -> set:
+        tick = int(now / self.resolution)
+        if self.current_tick is None:
+            self.current_tick = tick
+            return set()
+        due = set()
+        # if we've been idle for longer than a full turn of the wheel, every slot is due
+        for t in range(self.current_tick + 1, min(tick, self.current_tick + self.n_slots) + 1):
+            slot = self.slots[t % self.n_slots]
+            if slot:
+                due |= slot
+                slot.clear()
+        self.current_tick = max(self.current_tick, tick)
+        return due
+
+
+class RankIndex:
+    # Order statistics structure for the ranking, replaces sorting the whole player_ranks list on every update.
+    # Keys are (-score, player_id) so ascending order = best score first, ties broken by player_id.
+    # Stored as a list of sorted buckets of ~LOAD keys (like a B-tree with 1 level):
+    #   add/remove = bisect to the bucket + insort/del inside it (a memmove of <= 2 * LOAD pointers)
+    #   rank       = keys in the buckets before (Fenwick tree over bucket sizes, O(log n)) + bisect inside the bucket
+    #   top(k)     = walk the buckets from the front, O(k)
+    LOAD = 1000
+
+    def __init__(self):
+        self.buckets = []  # list of sorted lists
+        self.maxes = []  # last key of each bucket, to bisect on
+        self.size = 0
+        self.tree = None  # Fenwick tree of bucket sizes, None = needs rebuilding (buckets were split/removed)
+
+    def __len__(self):
+        return self.size
+
+    def _build_tree(self):
+        tree = [0] + [len(b) for b in self.buckets]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _tree_add(self, bucket_idx, delta):
+        if self.tree is None:
+            return  # will be rebuilt from scratch on the next rank()
+        i = bucket_idx + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def _count_before(self, bucket_idx):
+        if self.tree is None:
+            self._build_tree()
+        total, i = 0, bucket_idx
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, key):
+        self.size += 1
+        if not self.buckets:
+            self.buckets.append([key])
+            self.maxes.append(key)
+            self.tree = None
+            return
+        i = bisect_left(self.maxes, key)
+        if i == len(self.buckets):  # bigger than everything, goes at the end of the last bucket
+            i -= 1
+            self.buckets[i].append(key)
+            self.maxes[i] = key
+        else:
+            insort(self.buckets[i], key)
+        bucket = self.buckets[i]
+        if len(bucket) > 2 * self.LOAD:  # split so inserts stay cheap
+            self.buckets.insert(i + 1, bucket[self.LOAD :])
+            del bucket[self.LOAD :]
+            self.maxes[i] = bucket[-1]
+            self.maxes.insert(i + 1, self.buckets[i + 1][-1])
+            self.tree = None
+        else:
+            self._tree_add(i, 1)
+
+    def remove(self, key):
+        i = bisect_left(self.maxes, key)
+        bucket = self.buckets[i] if i < len(self.buckets) else []
+        pos = bisect_left(bucket, key)
+        if pos == len(bucket) or bucket[pos] != key:
+            raise KeyError(key)
+        del bucket[pos]
+        self.size -= 1
+        if not bucket:
+            del self.buckets[i]
+            del self.maxes[i]
+            self.tree = None
+        else:
+            self.maxes[i] = bucket[-1]
+            self._tree_add(i, -1)
+
+    def rank(self, key) -> int:
+        # 0 based position of key
+        i = bisect_left(self.maxes, key)
+        if i == len(self.buckets):
+            raise KeyError(key)
+        bucket = self.buckets[i]
+        pos = bisect_left(bucket, key)
+        if pos == len(bucket) or bucket[pos] != key:
+            raise KeyError(key)
+        return self._count_before(i) + pos
+
+    def rebuild(self, keys):
+        # Bulk load, cheaper than removing + adding when most of the keys changed at once
+        self._load(sorted(keys))
+
+    def replace(self, removed, added):
+        # remove every key in removed + add every key in added, in 1 pass over the index and 1 merge: O(n + m log m).
+        # Cheaper than 1 remove/add per key once a batch changes more than a few % of the keys.
+        removed = set(removed)
+        keys = [key for bucket in self.buckets for key in bucket if key not in removed]
+        if len(keys) != self.size - len(removed):
+            raise KeyError("some of the removed keys are not in the index")
+        keys.extend(sorted(added))
+        keys.sort()  # 2 sorted runs, timsort just merges them
+        self._load(keys)
+
+    def _load(self, keys):
+        # keys already sorted
+        self.buckets = [keys[i : i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+        self.size = len(keys)
+        self.tree = None
+
+    def count_less(self, key) -> int:
+        # how many keys sort before key, key itself doesn't have to be in the index
+        i = bisect_left(self.maxes, key)
+        if i == len(self.buckets):
+            return self.size
+        return self._count_before(i) + bisect_left(self.buckets[i], key)
+
+    def top(self, k: int) -> list:
+        result = []
+        for bucket in self.buckets:
+            if len(result) >= k:
+                break
+            result.extend(bucket[: k - len(result)])
+        return result
+
+
+class ScoreView:
+    # 1 named ranking with its own index, so querying it is O(k) no matter how many other views there are.
+    #   "cumulative" = all time total, "best" = best single score, "window" = total over the last window_seconds
+    # Window views don't keep their own history. They share each player's DynamicScore (which holds enough history for the
+    # longest window) and just remember how far into it they have expired (`expired`, counting from the very first entry).
+    KINDS = ("cumulative", "best", "window")
+
+    def __init__(
+        self, name: str, kind: str, window_seconds: float = None, wheel_resolution: float = 1.0, now: float = None
+    ):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown view kind {kind!r}, expected one of {self.KINDS}")
+        if (kind == "window") != (window_seconds is not None):
+            raise ValueError("window_seconds is needed for (and only for) window views")
+        self.name = name
+        self.kind = kind
+        self.window_seconds = window_seconds
+        self.ranking = RankIndex()
+        self.rank_keys = {} # the key each player currently has in the ranking, so it can be removed
+        self.scores = {}
+        if kind == "window":
+            self.expiry = TimeWheel(window_seconds, wheel_resolution, now) # expires the windows of idle players
+            self.expired = {}
+
+    def set_score(self, player_id, score):
+        # take the player out of the index and put them back with their new score: O(log n)
+        self.scores[player_id] = score
+        old_key = self.rank_keys.get(player_id)
+        key = (-score, player_id)
+        if old_key == key:
+            return
+        if old_key is not None:
+            self.ranking.remove(old_key)
+        self.rank_keys[player_id] = key
+        self.ranking.add(key)
+
+    def set_scores(self, new_scores: dict):
+        # if more than a few % of the board moved at once, merge all the changes into the index in 1 pass instead
+        if len(new_scores) > len(self.ranking) // 16:
+            self.scores.update(new_scores)
+            removed, added = [], []
+            for player_id, score in new_scores.items():
+                key = (-score, player_id)
+                old_key = self.rank_keys.get(player_id)
+                if old_key == key:
+                    continue
+                if old_key is not None:
+                    removed.append(old_key)
+                self.rank_keys[player_id] = key
+                added.append(key)
+            self.ranking.replace(removed, added)
+        else:
+            for player_id, score in new_scores.items():
+                self.set_score(player_id, score)
+
+    def expire(self, player_id, history: DynamicScore, now: float, total) -> int:
+        # Window views only: take everything older than the window off `total`, return what's left
+        h = history.score_history
+        idx = self.expired.get(player_id, history.base)
+        cutoff = now - self.window_seconds
+        while idx - history.base < len(h) and h[idx - history.base][0] <= cutoff:
+            total -= h[idx - history.base][1]
+            idx += 1
+        self.expired[player_id] = idx
+        return total
+
+    def top(self, top_k: int) -> list[(str, int)]:
+        return [(player_id, -neg_score) for neg_score, player_id in self.ranking.top(top_k)]
+
+    def rank_of(self, player_id) -> int:
+        # 1 = top of the leaderboard, None if we've never seen the player
+        key = self.rank_keys.get(player_id)
+        if key is None:
+            return None
+        return self.ranking.rank(key) + 1
+
+
 class Scoreboard:
-    player_scores: dict[str]
-    player_scores_dynamic: dict[str, DynamicScore] # For part 3
-    player_ranks: list[str]
+    player_scores: dict[str] # cumulative
+    player_best: dict[str]
+    player_scores_dynamic: dict[str, DynamicScore] # For part 3, history long enough for the longest window view
+    views: dict[str, ScoreView]
     
-    def __init__(self):
+    def __init__(self, window_seconds: float = 10, wheel_resolution: float = 1.0):
         self.player_scores = {}
+        self.player_best = {}
         self.player_scores_dynamic = {}
-        self.player_ranks = []
+        self.views = {}
+        self.window_views = [] # shortest window first
+        self.wheel_resolution = wheel_resolution
+        self.history_seconds = window_seconds
+        # query() returns these 2
+        self.add_view("cumulative", "cumulative")
+        self.add_view("window", "window", window_seconds)
 
+    def add_view(self, name: str, kind: str, window_seconds: float = None, now: float = None) -> ScoreView:
+        # e.g. add_view("best", "best"), add_view("last_5_min", "window", 300), add_view("last_hour", "window", 3600)
+        # A view added later starts from the current state. A window longer than any existing one can only see the history
+        # that was still being kept, so it is accurate from the time it was added onwards.
+        # now = when the view is added, on the same clock as the update() timestamps (default: time.time())
+        if name in self.views:
+            raise ValueError(f"View {name!r} already exists")
+        if self.player_scores and now is None:
+            now = time.time()
+        view = ScoreView(name, kind, window_seconds, self.wheel_resolution, now)
+        self.views[name] = view
+        if kind == "cumulative":
+            view.set_scores(self.player_scores)
+        elif kind == "best":
+            view.set_scores({p: best for p, best in self.player_best.items() if best is not None})
+        else:
+            self.window_views.append(view)
+            self.window_views.sort(key=lambda v: v.window_seconds)
+            if window_seconds > self.history_seconds:
+                self.history_seconds = window_seconds
+                for history in self.player_scores_dynamic.values():
+                    history.window_seconds = window_seconds
+            totals = {}
+            for player_id, history in self.player_scores_dynamic.items():
+                totals[player_id] = view.expire(player_id, history, now, history.sum_score_window)
+                view.expiry.schedule(player_id, now + window_seconds)
+            view.set_scores(totals)
+        return view
+
+    def _expire_windows(self, player_id, now: float, added=0) -> dict:
+        # Expire the player in every window view (shortest first), then trim the shared history to the longest window.
+        # Every view has to expire before the trim, so nothing gets popped that a view still counts.
+        history = self.player_scores_dynamic[player_id]
+        totals = {}
+        for view in self.window_views:
+            totals[view.name] = view.expire(player_id, history, now, view.scores.get(player_id, 0) + added)
+        history.keep_in_window(now)
+        return totals
+
+    def expire_idle(self, now: float = None):
+        # Decay the window sums of everyone with entries falling out of a window, whether they sent events or not
+        if now is None:
+            now = time.time()
+        due = set()
+        for view in self.window_views:
+            due |= view.expiry.advance(now)
+        for player_id in due:
+            for name, total in self._expire_windows(player_id, now).items():
+                self.views[name].set_score(player_id, total)
+
+    def _new_player(self, player_id):
+        self.player_scores[player_id] = 0
+        self.player_best[player_id] = None
+        self.player_scores_dynamic[player_id] = DynamicScore(self.history_seconds)
         
-    def update(self, player_id, incoming_score):
-        
-        new_player = False
-        if self.player_scores.get(player_id) is None:
-            new_player = True
+    def update(self, player_id, incoming_score, timestamp: float = None):
+        # 1 ingestion pass for every view: the shared state is updated once, then each view only re-ranks this player
+        if timestamp is None:
+            timestamp = time.time()
+        self.expire_idle(timestamp)
         
         # To track them by their cumulative scores, we just need to add the scores to our existing score list instead of replacing:
         # Create an entry for them first
-        if new_player:
-            self.player_scores[player_id] = 0
-            self.player_scores_dynamic[player_id] = DynamicScore()
-        # self.player_scores[player_id] = incoming_score
+        if player_id not in self.player_scores:
+            self._new_player(player_id)
         self.player_scores[player_id] += incoming_score
-        self.player_scores_dynamic[player_id].update_score_history(incoming_score)
-        
-        if not new_player:
-            self.player_ranks.pop(self.player_ranks.index(player_id)) # remove them first
-            
-        self.player_ranks.append(player_id) # dump them to the back
-        
-        self.player_ranks.sort(reverse=True, key=lambda x: self.player_scores[x]) # sort based on the map scores descending.
-        
-        # For stage 3, instead of sorting by the scores only, we now sort nby the dynamic score sum:
-        self.player_ranks.sort(reverse=True, key=lambda x: self.player_scores_dynamic[x].sum_score_window) # sort based on the map scores descending.
-        
-            
-            
+        best = self.player_best[player_id]
+        new_best = best is None or incoming_score > best
+        if new_best:
+            self.player_best[player_id] = incoming_score
+        self.player_scores_dynamic[player_id].add(incoming_score, timestamp)
+        window_totals = self._expire_windows(player_id, timestamp, added=incoming_score)
+
+        for view in self.views.values():
+            if view.kind == "cumulative":
+                view.set_score(player_id, self.player_scores[player_id])
+            elif view.kind == "best":
+                if new_best:
+                    view.set_score(player_id, incoming_score)
+            else:
+                view.set_score(player_id, window_totals[view.name])
+                view.expiry.schedule(player_id, timestamp + view.window_seconds)
+
+    def update_many(self, player_ids, scores, timestamps=None):
+        # Batched version of update(), e.g. 1 second worth of events from a game server.
+        # Takes numpy arrays (or any sequences). The batch is grouped by player first, so each player in the batch gets
+        # 1 history entry (their total, stamped with their latest timestamp in the batch) and 1 re-rank per view, instead of 1 per event.
+        # So inside a batch, expiry is only as precise as the batch span.
+        now = time.time()
+        grouped = group_scores(player_ids, scores, timestamps, now)
+        if not grouped:
+            return
+        self.expire_idle(max(latest for _, _, _, latest in grouped))
+
+        new_scores = {name: {} for name in self.views}
+        for player_id, total, best, latest in grouped:
+            if player_id not in self.player_scores:
+                self._new_player(player_id)
+            self.player_scores[player_id] += total
+            new_scores_best = self.player_best[player_id] is None or best > self.player_best[player_id]
+            if new_scores_best:
+                self.player_best[player_id] = best
+            self.player_scores_dynamic[player_id].add(total, latest)
+            window_totals = self._expire_windows(player_id, latest, added=total)
+
+            for view in self.views.values():
+                if view.kind == "cumulative":
+                    new_scores[view.name][player_id] = self.player_scores[player_id]
+                elif view.kind == "best":
+                    if new_scores_best:
+                        new_scores[view.name][player_id] = best
+                else:
+                    new_scores[view.name][player_id] = window_totals[view.name]
+                    view.expiry.schedule(player_id, latest + view.window_seconds)
+
+        # Refresh each ranking once for the whole batch
+        for name, view_scores in new_scores.items():
+            self.views[name].set_scores(view_scores)
+
+    def query_view(self, name: str, top_k: int, now: float = None) -> list[(str, int)]:
+        self.expire_idle(now)
+        return self.views[name].top(top_k)
         
-    def query(self, top_k:int)->list[(str, int)]:
-        players = self.player_ranks[0:top_k]
-        cum_results = [(player_id, self.player_scores[player_id]) for player_id in players]
-        dynamic_results = [(player_id, self.player_scores_dynamic[player_id].sum_score_window) for player_id in players]
-        return cum_results, dynamic_results
-    
-    
-    
+    def query(self, top_k:int, now: float = None)->list[(str, int)]:
+        # top k by cumulative score and top k by windowed score, each in its own order
+        self.expire_idle(now)
+        return self.views["cumulative"].top(top_k), self.views["window"].top(top_k)
+
+    def rank_of(self, player_id, now: float = None, view: str = "window") -> int:
+        # 1 = top of the leaderboard, None if we've never seen the player
+        self.expire_idle(now)
+        return self.views[view].rank_of(player_id)
+
+
+def group_scores(player_ids, scores, timestamps=None, now: float = None) -> list:
+    # Group by player: [(player_id, total score, best single score, latest timestamp)], 1 per distinct player in the batch.
+    # Vectorized with numpy when the batch comes in as numpy arrays, plain dict otherwise.
+    if now is None:
+        now = time.time()
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None and isinstance(player_ids, np.ndarray):
+        if len(player_ids) == 0:
+            return []
+        unique_ids, inverse = np.unique(player_ids, return_inverse=True)
+        scores = np.asarray(scores)
+        if np.issubdtype(scores.dtype, np.integer):
+            # bincount sums in float64, which drops precision past 2^53, so integer scores are summed as int64
+            totals = np.zeros(len(unique_ids), dtype=np.int64)
+            np.add.at(totals, inverse, scores)
+            best = np.full(len(unique_ids), np.iinfo(np.int64).min)
+        else:
+            totals = np.bincount(inverse, weights=scores, minlength=len(unique_ids))
+            best = np.full(len(unique_ids), -np.inf)
+        np.maximum.at(best, inverse, scores)
+        if timestamps is None:
+            latest = np.full(len(unique_ids), now)
+        else:
+            latest = np.full(len(unique_ids), -np.inf)
+            np.maximum.at(latest, inverse, np.asarray(timestamps, dtype=float))
+        return list(zip(unique_ids.tolist(), totals.tolist(), best.tolist(), latest.tolist()))
+
+    totals = {}
+    best = {}
+    latest = {}
+    if timestamps is None:
+        timestamps = [now] * len(scores)
+    for player_id, score, ts in zip(player_ids, scores, timestamps):
+        if player_id in totals:
+            totals[player_id] += score
+            if score > best[player_id]:
+                best[player_id] = score
+            if ts > latest[player_id]:
+                latest[player_id] = ts
+        else:
+            totals[player_id] = score
+            best[player_id] = score
+            latest[player_id] = ts
+    return [
+        (player_id, total, best[player_id], latest[player_id])
+        for player_id, total in totals.items()
+    ]
+
+
 # Extra helper to generate fake names or reuse names randomly to test the scoring.
 def choose_player(players, chance_new, max_players):
 
@@ -109,30 +532,92 @@ def choose_player(players, chance_new, max_players):
         p = players[random.randint(0,len(players)-1)] # pick a random player
     
     return p, players
-    
-scoreboard = Scoreboard()
-n = 3
-max_players = 5
-players = []
-
-
-while True:
-    p, players = choose_player(players, chance_new=0.1, max_players=10)
-    s = random.randint(0,10)
-    # p = input("Add player: ")
-    # s = int(input("Add score: "))
-    scoreboard.update(p,s)
-    cumulative_results, dynamic_results = scoreboard.query(n)
-    print("---" *20)
-    print("Cumulative:")
-    for player_id, score in sorted(cumulative_results, key=lambda x: x[1], reverse=True):
-        print(f"{player_id}: {score}")
-
-    print("\nDynamic:")
-    for player_id, score in sorted(dynamic_results, key=lambda x: x[1], reverse=True):
-        print(f"{player_id}: {score}")
-    print("\n\n\n")
-    time.sleep(0.2)
+
+
+def benchmark(n_players=1_000_000, n_updates=1_000_000):
+    # Load n_players into the board, then time n_updates random score events on top of it.
+    # Measured at 1M players: ~23k updates/s with update() and ~27k events/s with update_many() (benchmark_batches),
+    # so well short of 100k/s. Every event moves a key in 2 RankIndexes (cumulative + window) and that's pure Python
+    # tuple compares and list shuffling, it would need the rankings in C/numpy to get there.
+    rng = random.Random(0)
+    scoreboard = Scoreboard()
+    start = time.perf_counter()
+    for p in range(n_players):
+        scoreboard.update(f"player{p}", rng.randint(0, 10))
+    print(f"loaded {n_players} players in {time.perf_counter() - start:.1f}s")
+
+    events = [(f"player{rng.randrange(n_players)}", rng.randint(0, 10)) for _ in range(n_updates)]
+    start = time.perf_counter()
+    for p, s in events:
+        scoreboard.update(p, s)
+    elapsed = time.perf_counter() - start
+    print(f"{n_updates} updates in {elapsed:.1f}s = {n_updates / elapsed:.0f} updates/s")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        scoreboard.query(10)
+        scoreboard.rank_of(events[0][0])
+    print(f"query(10) + rank_of: {(time.perf_counter() - start) / 1000 * 1e6:.1f}us")
+
+
+def benchmark_batches(n_players=1_000_000, n_batches=20, batch_size=50_000):
+    # update() per event vs update_many() per batch, on the same events
+    rng = random.Random(0)
+    batches = []
+    for b in range(n_batches):
+        ids = [f"player{rng.randrange(n_players)}" for _ in range(batch_size)]
+        scores = [rng.randint(0, 10) for _ in range(batch_size)]
+        timestamps = [1_000_000 + b + i / batch_size for i in range(batch_size)]
+        batches.append((ids, scores, timestamps))
+
+    for name in ["update", "update_many"]:
+        scoreboard = Scoreboard()
+        start = time.perf_counter()
+        for ids, scores, timestamps in batches:
+            if name == "update":
+                for p, s, ts in zip(ids, scores, timestamps):
+                    scoreboard.update(p, s, ts)
+            else:
+                scoreboard.update_many(ids, scores, timestamps)
+        elapsed = time.perf_counter() - start
+        n_events = n_batches * batch_size
+        print(f"{name}: {n_events / elapsed:.0f} events/s ({elapsed / n_batches * 1000:.0f}ms per batch of {batch_size})")
+
+
+def demo():
+    scoreboard = Scoreboard()
+    n = 3
+    max_players = 5
+    players = []
+
+
+    while True:
+        p, players = choose_player(players, chance_new=0.1, max_players=10)
+        s = random.randint(0,10)
+        # p = input("Add player: ")
+        # s = int(input("Add score: "))
+        scoreboard.update(p,s)
+        cumulative_results, dynamic_results = scoreboard.query(n)
+        print("---" *20)
+        print("Cumulative:")
+        for player_id, score in sorted(cumulative_results, key=lambda x: x[1], reverse=True):
+            print(f"{player_id}: {score}")
+
+        print("\nDynamic:")
+        for player_id, score in sorted(dynamic_results, key=lambda x: x[1], reverse=True):
+            print(f"{player_id}: {score}")
+        print("\n\n\n")
+        time.sleep(0.2)
+
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench_batches":
+        benchmark_batches(*[int(x) for x in sys.argv[2:]])
+    else:
+        demo()
     
     
 # Review:
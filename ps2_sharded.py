@@ -0,0 +1,239 @@
+"""
+Sharded version of the ps2 leaderboard, for when 1 Scoreboard in 1 Python thread can't keep up.
+
+Players are hash partitioned over N worker processes, each with its own local ps2.Scoreboard.
+The parent batches events per shard and ships each batch over that shard's multiprocessing queue,
+so the per-event cost in the parent is just a hash + list append.
+Each worker applies a batch with Scoreboard.update_many(), so within a batch windowed expiry is only as precise as the batch span.
+
+query_view(name, top_k): every shard returns its own top k for that view (already sorted), then a k-way heap merge picks the global top k.
+A player only ever lives on 1 shard, so the global top k is always inside the union of the per-shard top k's.
+rank_of(player): ask every shard how many of its players are ahead of that player's key, and add them up.
+"""
+
+import heapq
+import multiprocessing as mp
+import os
+import pickle
+import queue
+import random
+import sys
+import time
+from itertools import islice
+from typing import List, Optional, Tuple
+
+from ps2 import Scoreboard
+
+
+def _shard_worker(inbox, outbox, window_seconds, wheel_resolution):
+    # Every reply is ("ok", value) or ("error", exception). A failure while applying events or adding a view has no
+    # reply to go into, so it is kept and sent back for every query after it: the shard's state can't be trusted anymore.
+    scoreboard = Scoreboard(window_seconds, wheel_resolution)
+    failure = None
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            break
+        kind, payload = msg
+        if failure is not None:
+            if kind in ("top", "key", "count_less"):
+                outbox.put(("error", failure))
+            continue
+        try:
+            reply = _handle(scoreboard, kind, payload)
+        except Exception as e:
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError(repr(e))  # has to make it through the queue
+            if kind in ("top", "key", "count_less"):
+                outbox.put(("error", e))
+            else:
+                failure = e
+            continue
+        if kind in ("top", "key", "count_less"):
+            outbox.put(("ok", reply))
+
+
+def _handle(scoreboard, kind, payload):
+    if kind == "events":
+        player_ids, scores, timestamps = zip(*payload)
+        scoreboard.update_many(player_ids, scores, timestamps)
+    elif kind == "top":
+        view, top_k, now = payload
+        scoreboard.expire_idle(now)
+        # rank keys (-score, player_id) of that view, already sorted, ready for heapq.merge in the parent
+        return scoreboard.views[view].ranking.top(top_k)
+    elif kind == "key":
+        view, player_id, now = payload
+        scoreboard.expire_idle(now)
+        return scoreboard.views[view].rank_keys.get(player_id)
+    elif kind == "count_less":
+        view, key, now = payload
+        scoreboard.expire_idle(now)
+        return scoreboard.views[view].ranking.count_less(key)
+    elif kind == "add_view":
+        scoreboard.add_view(*payload)
+
+
+class ShardedScoreboard:
+    REPLY_POLL = 1.0
+
+    def __init__(
+        self,
+        n_shards: int = None,
+        window_seconds: float = 10,
+        wheel_resolution: float = 1.0,
+        batch_size: int = 1000,
+    ):
+        self.n_shards = n_shards or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batches = [[] for _ in range(self.n_shards)]
+        self.inboxes = []
+        self.outboxes = []
+        self.workers = []
+        for _ in range(self.n_shards):
+            inbox, outbox = mp.Queue(), mp.Queue()
+            worker = mp.Process(
+                target=_shard_worker,
+                args=(inbox, outbox, window_seconds, wheel_resolution),
+                daemon=True,
+            )
+            worker.start()
+            self.inboxes.append(inbox)
+            self.outboxes.append(outbox)
+            self.workers.append(worker)
+
+    def shard_of(self, player_id) -> int:
+        return hash(player_id) % self.n_shards
+
+    def update(self, player_id, incoming_score, timestamp: float = None):
+        # Timestamps are taken here (not in the workers) so every shard agrees on when an event happened
+        if timestamp is None:
+            timestamp = time.time()
+        shard = hash(player_id) % self.n_shards
+        batch = self.batches[shard]
+        batch.append((player_id, incoming_score, timestamp))
+        if len(batch) >= self.batch_size:
+            self.inboxes[shard].put(("events", batch))
+            self.batches[shard] = []
+
+    def flush(self):
+        # Send any partial batches, queries call this first so they see every event sent before them
+        for shard, batch in enumerate(self.batches):
+            if batch:
+                self.inboxes[shard].put(("events", batch))
+                self.batches[shard] = []
+
+    def _ask_all(self, kind, payload) -> list:
+        self.flush()
+        for inbox in self.inboxes:
+            inbox.put((kind, payload))
+        replies, error = [], None
+        for shard in range(self.n_shards):
+            try:
+                replies.append(self._reply(shard))
+            except Exception as e:
+                error = error or e  # keep reading the other shards, or their answers would be taken as the next ones
+        if error is not None:
+            raise error
+        return replies
+
+    def _reply(self, shard: int):
+        # Wait for the shard's answer, re-raising whatever went wrong in it. A worker that died (killed, out of memory)
+        # never answers, so check it's still there every REPLY_POLL seconds instead of blocking forever.
+        while True:
+            try:
+                status, value = self.outboxes[shard].get(timeout=self.REPLY_POLL)
+            except queue.Empty:
+                worker = self.workers[shard]
+                if not worker.is_alive():
+                    raise RuntimeError(f"Shard {shard} worker died (exit code {worker.exitcode})")
+                continue
+            if status == "error":
+                raise value
+            return value
+
+    def add_view(self, name: str, kind: str, window_seconds: float = None, now: float = None):
+        # Same as Scoreboard.add_view, on every shard
+        self.flush()
+        for inbox in self.inboxes:
+            inbox.put(("add_view", (name, kind, window_seconds, now)))
+
+    def query_view(self, name: str, top_k: int, now: float = None) -> List[Tuple]:
+        if now is None:
+            now = time.time()
+        per_shard = self._ask_all("top", (name, top_k, now))
+        return [(player_id, -neg_score) for neg_score, player_id in islice(heapq.merge(*per_shard), top_k)]
+
+    def query(self, top_k: int, now: float = None) -> Tuple[List, List]:
+        # Same return value as Scoreboard.query
+        if now is None:
+            now = time.time()
+        return self.query_view("cumulative", top_k, now), self.query_view("window", top_k, now)
+
+    def rank_of(self, player_id, now: float = None, view: str = "window") -> Optional[int]:
+        if now is None:
+            now = time.time()
+        self.flush()
+        shard = self.shard_of(player_id)
+        self.inboxes[shard].put(("key", (view, player_id, now)))
+        key = self._reply(shard)
+        if key is None:
+            return None
+        return sum(self._ask_all("count_less", (view, key, now))) + 1
+
+    def close(self):
+        self.flush()
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def benchmark(n_events: int = 1_000_000, n_players: int = 100_000):
+    rng = random.Random(0)
+    now = time.time()
+    events = [
+        (f"player{rng.randrange(n_players)}", rng.randint(0, 10), now + i * 1e-6)
+        for i in range(n_events)
+    ]
+
+    # Baseline: 1 Scoreboard in this process
+    scoreboard = Scoreboard()
+    start = time.perf_counter()
+    for p, s, ts in events:
+        scoreboard.update(p, s, ts)
+    scoreboard.query(10, now + n_events * 1e-6)
+    baseline = n_events / (time.perf_counter() - start)
+    print(f"single Scoreboard: {baseline:.0f} events/s")
+
+    shard_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    for n_shards in shard_counts:
+        with ShardedScoreboard(n_shards) as sharded:
+            start = time.perf_counter()
+            for p, s, ts in events:
+                sharded.update(p, s, ts)
+            sharded.query(10, now + n_events * 1e-6)  # only returns once every shard has drained its queue
+            rate = n_events / (time.perf_counter() - start)
+        print(f"{n_shards} shards: {rate:.0f} events/s ({rate / baseline:.2f}x)")
+    print(f"({os.cpu_count()} cpus available)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
+    else:
+        with ShardedScoreboard(4) as scoreboard:
+            for _ in range(10_000):
+                scoreboard.update(f"player{random.randrange(500)}", random.randint(0, 10))
+            cumulative_results, dynamic_results = scoreboard.query(5)
+            print("Cumulative:", cumulative_results)
+            print("Dynamic:", dynamic_results)
+            print("rank of", dynamic_results[-1][0], "=", scoreboard.rank_of(dynamic_results[-1][0]))
@@ -0,0 +1,346 @@
+"""
+Approximate version of the ps2 leaderboard, for when there are too many players to keep a Scoreboard entry
+(cumulative score, DynamicScore history, rank keys) for every single one of them.
+
+Memory is fixed at construction, no matter how many distinct players show up:
+  - SpaceSaving(capacity): keeps counters for at most `capacity` players. A new player takes over the counter of
+    the current minimum and inherits its count as error. Every player whose true score is > total / capacity is
+    guaranteed to have a counter, and for players with a counter count - error <= true score <= count.
+  - CountMin(width, depth): depth rows of width counters, every player adds to 1 counter per row.
+    The smallest of its counters never under-estimates, and over-estimates by <= e / width * total with
+    probability >= 1 - e^-depth. Used to tighten the upper bounds SpaceSaving gives.
+  - The sliding window is a ring of n_intervals of these sketches, 1 per window_seconds / n_intervals seconds.
+    The oldest interval is dropped as a whole, so the window is rounded to whole intervals.
+
+Scores have to be >= 0 (the error bounds don't hold otherwise), which is what the game sends anyway.
+Every result comes with (lower, upper) bounds on the true score, the estimate is the upper bound.
+"""
+
+import heapq
+import random
+import sys
+import time
+from array import array
+from math import e, exp
+
+from ps2 import Scoreboard
+
+
+class SpaceSaving:
+    # Weighted Space-Saving. `heap` holds 1 (count, player) entry per counter, but counts are only pushed down into it
+    # lazily when we look for the minimum: counts only ever grow, so a stale entry is always <= the real count.
+    BYTES_PER_COUNTER = 220  # 2 dict entries + 1 heap tuple, measured with tracemalloc (not counting the player ids)
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("Need at least 1 counter")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []
+        self.total = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, player_id, score):
+        if score < 0:
+            raise ValueError(f"Scores have to be >= 0, got {score}")
+        self.total += score
+        counts = self.counts
+        if player_id in counts:
+            counts[player_id] += score
+        elif len(counts) < self.capacity:
+            counts[player_id] = score
+            self.errors[player_id] = 0
+            heapq.heappush(self.heap, (score, player_id))
+        else:
+            min_count, victim = self._min_entry()
+            del counts[victim]
+            del self.errors[victim]
+            counts[player_id] = min_count + score
+            self.errors[player_id] = min_count
+            heapq.heapreplace(self.heap, (min_count + score, player_id))
+
+    def _min_entry(self):
+        heap, counts = self.heap, self.counts
+        while True:
+            count, player_id = heap[0]
+            actual = counts[player_id]
+            if actual == count:
+                return count, player_id
+            heapq.heapreplace(heap, (actual, player_id))
+
+    def min_count(self):
+        # upper bound for any player without a counter
+        if len(self.counts) < self.capacity:
+            return 0
+        return self._min_entry()[0]
+
+    def bounds(self, player_id, floor=None) -> (int, int):
+        # floor = min_count(), pass it in when asking for many players in a row
+        count = self.counts.get(player_id)
+        if count is None:
+            return 0, self.min_count() if floor is None else floor
+        return count - self.errors[player_id], count
+
+    def top(self, top_k: int) -> list:
+        # O(capacity), [(player_id, count)] best first
+        best = heapq.nsmallest(top_k, ((-count, p) for p, count in self.counts.items()))
+        return [(p, -neg_count) for neg_count, p in best]
+
+    def clear(self):
+        self.counts.clear()
+        self.errors.clear()
+        self.heap.clear()
+        self.total = 0
+
+    def nbytes(self) -> int:
+        return self.capacity * self.BYTES_PER_COUNTER
+
+
+class CountMin:
+    def __init__(self, width: int, depth: int = 4, seed: int = 0):
+        if width < 1 or depth < 1:
+            raise ValueError("Need at least 1 row of 1 counter")
+        rng = random.Random(seed)
+        self.width = width
+        self.salts = [rng.getrandbits(61) for _ in range(depth)]
+        self.rows = [array("q", [0]) * width for _ in range(depth)]
+        self.total = 0
+
+    def add(self, player_id, score):
+        h = hash(player_id)
+        width = self.width
+        for salt, row in zip(self.salts, self.rows):
+            row[hash((salt, h)) % width] += score
+        self.total += score
+
+    def estimate(self, player_id) -> int:
+        h = hash(player_id)
+        width = self.width
+        return min(row[hash((salt, h)) % width] for salt, row in zip(self.salts, self.rows))
+
+    def error_bound(self) -> float:
+        # estimate - true score <= this, with probability >= confidence()
+        return e / self.width * self.total
+
+    def confidence(self) -> float:
+        return 1 - exp(-len(self.rows))
+
+    def clear(self):
+        for row in self.rows:
+            row[:] = array("q", [0]) * self.width
+        self.total = 0
+
+    def nbytes(self) -> int:
+        return sum(row.itemsize * len(row) for row in self.rows)
+
+
+class Sketch:
+    # SpaceSaving for the candidates + CountMin to tighten their upper bounds
+    def __init__(self, capacity: int, cm_width: int, cm_depth: int = 4, seed: int = 0):
+        self.heavy = SpaceSaving(capacity)
+        self.cm = CountMin(cm_width, cm_depth, seed) if cm_width else None
+
+    def add(self, player_id, score):
+        self.heavy.add(player_id, score)
+        if self.cm is not None:
+            self.cm.add(player_id, score)
+
+    def bounds(self, player_id, floor=None) -> (int, int):
+        lower, upper = self.heavy.bounds(player_id, floor)
+        if self.cm is not None:
+            upper = min(upper, self.cm.estimate(player_id))
+        return lower, upper
+
+    def clear(self):
+        self.heavy.clear()
+        if self.cm is not None:
+            self.cm.clear()
+
+    def nbytes(self) -> int:
+        return self.heavy.nbytes() + (self.cm.nbytes() if self.cm is not None else 0)
+
+
+class ApproxScoreboard:
+    # Same update/query interface as ps2.Scoreboard, results are (player_id, estimate, lower, upper)
+    def __init__(
+        self,
+        capacity: int = 1000,  # SpaceSaving counters per sketch
+        window_seconds: float = 10,
+        n_intervals: int = 10,
+        cm_width: int = None,  # CountMin counters per row, 0 = SpaceSaving only. Default: 4 * capacity
+        cm_depth: int = 4,
+        seed: int = 0,
+    ):
+        if cm_width is None:
+            cm_width = 4 * capacity
+        self.window_seconds = window_seconds
+        self.interval_seconds = window_seconds / n_intervals
+        self.cumulative = Sketch(capacity, cm_width, cm_depth, seed)
+        self.ring = [Sketch(capacity, cm_width, cm_depth, seed) for _ in range(n_intervals)]
+        self.ring_ticks = [None] * n_intervals  # which interval each ring slot currently holds
+        self.current_tick = None
+
+    @classmethod
+    def for_memory(cls, n_bytes: int, window_seconds: float = 10, n_intervals: int = 10, cm_depth: int = 4, seed: int = 0):
+        # Split the budget evenly over the n_intervals + 1 sketches, and inside each 1 evenly between SpaceSaving and CountMin
+        per_sketch = n_bytes // (n_intervals + 1)
+        capacity = max(1, per_sketch // 2 // SpaceSaving.BYTES_PER_COUNTER)
+        cm_width = max(1, per_sketch // 2 // (8 * cm_depth))
+        return cls(capacity, window_seconds, n_intervals, cm_width, cm_depth, seed)
+
+    def nbytes(self) -> int:
+        return self.cumulative.nbytes() + sum(sketch.nbytes() for sketch in self.ring)
+
+    def _advance(self, now: float):
+        # Clear the ring slots of every interval that has fallen out of the window since last time
+        tick = int(now / self.interval_seconds)
+        if self.current_tick is not None and tick <= self.current_tick:
+            return
+        n = len(self.ring)
+        first = tick - n + 1 if self.current_tick is None else max(self.current_tick + 1, tick - n + 1)
+        for t in range(first, tick + 1):
+            slot = t % n
+            if self.ring_ticks[slot] is not None:
+                self.ring[slot].clear()
+            self.ring_ticks[slot] = t
+        self.current_tick = tick
+
+    def update(self, player_id, incoming_score, timestamp: float = None):
+        if timestamp is None:
+            timestamp = time.time()
+        self._advance(timestamp)
+        self.cumulative.add(player_id, incoming_score)
+        tick = int(timestamp / self.interval_seconds)
+        slot = tick % len(self.ring)
+        if self.ring_ticks[slot] == tick:  # events older than the window only count towards the cumulative score
+            self.ring[slot].add(player_id, incoming_score)
+
+    def update_many(self, player_ids, scores, timestamps=None):
+        if timestamps is None:
+            timestamps = [time.time()] * len(scores)
+        for player_id, score, ts in zip(player_ids, scores, timestamps):
+            self.update(player_id, score, ts)
+
+    def _live(self, now: float) -> list:
+        self._advance(now)
+        oldest = self.current_tick - len(self.ring) + 1
+        return [sketch for sketch, t in zip(self.ring, self.ring_ticks) if t is not None and t >= oldest]
+
+    def window_bounds(self, player_id, now: float = None) -> (int, int):
+        if now is None:
+            now = time.time()
+        lower = upper = 0
+        for sketch in self._live(now):
+            lo, hi = sketch.bounds(player_id)
+            lower += lo
+            upper += hi
+        return lower, upper
+
+    def query_cumulative(self, top_k: int) -> list:
+        # CountMin can only lower the SpaceSaving counts, so look a bit further down than top_k before re-sorting
+        floor = self.cumulative.heavy.min_count()
+        results = []
+        for player_id, _ in self.cumulative.heavy.top(2 * top_k):
+            lower, upper = self.cumulative.bounds(player_id, floor)
+            results.append((player_id, upper, lower, upper))
+        results.sort(key=lambda r: (-r[1], r[0]))
+        return results[:top_k]
+
+    def query_window(self, top_k: int, now: float = None) -> list:
+        # Candidates = every player with a counter in any live interval, O(n_intervals * capacity)
+        if now is None:
+            now = time.time()
+        live = self._live(now)
+        floors = [sketch.heavy.min_count() for sketch in live]
+        candidates = set()
+        for sketch in live:
+            candidates.update(sketch.heavy.counts)
+        results = []
+        for player_id in candidates:
+            lower = upper = 0
+            for sketch, floor in zip(live, floors):
+                lo, hi = sketch.bounds(player_id, floor)
+                lower += lo
+                upper += hi
+            results.append((player_id, upper, lower, upper))
+        return heapq.nsmallest(top_k, results, key=lambda r: (-r[1], r[0]))
+
+    def query(self, top_k: int, now: float = None):
+        # top k by cumulative score and top k by windowed score, same as Scoreboard.query but with bounds
+        return self.query_cumulative(top_k), self.query_window(top_k, now)
+
+
+def _zipf_events(n_events, n_players, skew, rng, start):
+    weights = [1 / (i + 1) ** skew for i in range(n_players)]
+    players = rng.choices(range(n_players), weights, k=n_events)
+    return [(f"player{p}", rng.randint(0, 10), start + i * 1e-4) for i, p in enumerate(players)]
+
+
+def benchmark(n_events=500_000, n_players=200_000, top_k=10, skew=1.1):
+    # Accuracy of the approximate top k vs the exact Scoreboard, for a few memory budgets
+    import tracemalloc
+
+    rng = random.Random(0)
+    start = 1_000_000.0
+    events = _zipf_events(n_events, n_players, skew, rng, start)
+    window_seconds = 10
+    # query right before an interval boundary, so the ring covers (almost exactly) the same window as the Scoreboard
+    now = (int(events[-1][2]) + 1) - 1e-6
+
+    tracemalloc.start()
+    scoreboard = Scoreboard(window_seconds)
+    t = time.perf_counter()
+    for p, s, ts in events:
+        scoreboard.update(p, s, ts)
+    rate = n_events / (time.perf_counter() - t)
+    exact_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    exact_cum = scoreboard.query_view("cumulative", top_k, now)
+    true_cum = scoreboard.player_scores
+    # The Scoreboard's idle players can be up to 1 wheel tick late to decay, so the window truth is recounted from the events
+    true_win = {}
+    for p, s, ts in events:
+        if ts > now - window_seconds:
+            true_win[p] = true_win.get(p, 0) + s
+    exact_win = sorted(true_win.items(), key=lambda x: (-x[1], x[0]))[:top_k]
+    print(f"exact: {exact_bytes / 1e6:.1f}MB, {rate:.0f} updates/s, {len(true_cum)} players")
+
+    print(f"{'budget':>8} {'MB used':>8} {'updates/s':>10} {'cum recall':>10} {'cum err':>8} {'win recall':>10} {'win err':>8} {'bounds ok':>9}")
+    for budget in [100_000, 300_000, 1_000_000, 4_000_000, 16_000_000]:
+        tracemalloc.start()
+        approx = ApproxScoreboard.for_memory(budget, window_seconds, n_intervals=10)
+        t = time.perf_counter()
+        for p, s, ts in events:
+            approx.update(p, s, ts)
+        rate = n_events / (time.perf_counter() - t)
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        approx_cum, approx_win = approx.query(top_k, now)
+
+        row = []
+        bounds_ok = True
+        for exact, found, truth in [(exact_cum, approx_cum, true_cum), (exact_win, approx_win, true_win)]:
+            recall = len({p for p, _ in exact} & {r[0] for r in found}) / max(1, len(exact))
+            err = sum(abs(r[1] - truth.get(r[0], 0)) / max(1, truth.get(r[0], 0)) for r in found) / max(1, len(found))
+            bounds_ok &= all(r[2] <= truth.get(r[0], 0) <= r[3] for r in found)
+            row += [recall, err]
+        print(
+            f"{budget / 1e6:>7.1f}M {used / 1e6:>8.1f} {rate:>10.0f} {row[0]:>10.0%} {row[1]:>8.2%} {row[2]:>10.0%} {row[3]:>8.2%} {str(bounds_ok):>9}"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
+    else:
+        scoreboard = ApproxScoreboard(capacity=50)
+        rng = random.Random(0)
+        for _ in range(100_000):
+            scoreboard.update(f"player{int(rng.paretovariate(1.2))}", rng.randint(0, 10))
+        cumulative_results, dynamic_results = scoreboard.query(5)
+        print("Cumulative (player, estimate, lower, upper):", cumulative_results)
+        print("Dynamic (player, estimate, lower, upper):", dynamic_results)
+        print(f"{scoreboard.nbytes()} bytes of counters")
@@ -41,19 +41,23 @@ titles = {
 }
 
 from collections import defaultdict
-import re
+
+from ps3_fuzzy import FuzzyIndex
+from ps3_loader import normalize, normalize_batch
+from ps3_trie import RadixTree
 
 
 def prepare_title_map(titles):
+    # lowercase + drop special characters for the whole lot in 1 go, with a precompiled (unicode aware) pattern
     title_map = defaultdict(list)
-    for k, title in titles.items():
-        title_clean = re.sub(r"[^A-Za-z0-9 ]", "", k.lower())
+    for title_clean, title in zip(normalize_batch(list(titles)), titles.values()):
         title_map[title_clean].append(title["title"])
     return title_map
 
 
 title_map = prepare_title_map(titles)
 print(title_map)
+title_index = RadixTree.from_title_map(title_map)
 # title_map = {
 #     "berlin": [
 #         "Berlin",
@@ -65,21 +69,18 @@ print(title_map)
 # Every time the user types, check the title_map for a starts_with, and return the TOP N matches, arranged by length of the map term (print)
 
 
-def get_top_n_matches(search_term, n=10, use_cache=False):
+def get_top_n_matches(search_term, n=10, use_cache=False, mode="prefix"):
+    # mode (with use_cache): "prefix" = forward only, "infix" = anywhere in the title, "fuzzy" = prefix with <= 2 typos
 
     if use_cache:
-        matched = list(cache.get(search_term, set()))
-        return matched
-
-    matched = []
-    for term, title_ids in title_map.items():
-        if term.startswith(search_term):
-            matched.append((term, title_ids))
+        if mode == "infix":
+            return fuzzy_index.infix(search_term, n)[0]
+        if mode == "fuzzy":
+            return fuzzy_index.fuzzy(search_term, n)[0]
+        return cache.top(search_term, n)
 
-    matched.sort(key=lambda x: len(x[0]))
-    if n == -1:
-        return matched
-    return matched[0:n]
+    # walk the radix tree down to the prefix, then take the n shortest terms below it (instead of scanning every term)
+    return title_index.matches(search_term, n)
 
 
 """
@@ -104,21 +105,9 @@ cache = {
 
 
 def generate_cache(title_map):
-    cache = defaultdict(set)
-    # loop through each possible search term
-    for term in title_map.keys():
-        print(term)
-        # then go through increasing letter in the title map
-        partial_term = ""
-        for l in term:
-            partial_term += l
-            print(partial_term)
-            results = get_top_n_matches(partial_term, n=-1)  # no limit
-            for r in results:
-                matched_term = r[0]  # just take the matching term
-                cache[partial_term].add(matched_term)
-
-    return cache
+    # The radix tree already is a cache of every prefix: each prefix is 1 walk down the tree away from its matches.
+    # Built in 1 pass over the sorted terms, instead of a full scan of title_map for every prefix of every term.
+    return RadixTree.from_title_map(title_map)
 
 
 cache = generate_cache(title_map)
@@ -135,48 +124,33 @@ the top 3 most popular matches for what the user has typed?
 # when generating the cache across all search terms, we want to re-rank each list by the popularity
 
 
-def generate_popularity_cache(title_map):
-    cache = defaultdict(list)
-    # loop through each possible search term
-    for term in title_map.keys():
-        print(term)
-        # then go through increasing letter in the title map
-        partial_term = ""
-        for l in term:
-            partial_term += l
-            print(partial_term)
-            results = get_top_n_matches(partial_term, n=-1)  # no limit
-            for r in results:
-                matched_term = r[0]  # just take the matching term
-
-                # in this case, let's append the exact title, and not just the matched term
-                exact_matched_titles = title_map[matched_term]
-                cache[partial_term].extend(exact_matched_titles)
-
-            # after we are done for the term `ber`:
-            # rerank by popularity
-            reranked = cache.get(partial_term)
-            reranked = list(set(reranked))  # remove duplicates
-            reranked.sort(
-                reverse=True,
-                key=lambda x: titles[x][
-                    "popularity"
-                ],  # go back to the original title list with popularity
-            )  # reverse it since the most popular will have the largest key value
-            cache[partial_term] = reranked
-    return cache
+def generate_popularity_cache(title_map, top_k=10):
+    # Instead of keeping every matching title for every prefix and re-sorting them, each node of the radix tree keeps
+    # only the top_k most popular titles below it (merged bottom-up while the tree is built).
+    # The top 3 for what the user typed is then 1 walk down the tree + the first 3 of that node's list.
+    return RadixTree.from_title_map(
+        title_map,
+        top_k=top_k,
+        popularity=lambda x: titles[x]["popularity"],  # go back to the original title list with popularity
+    )
 
 
 cache = generate_popularity_cache(title_map)
 print("with popularity ranking")
 print(cache)
+fuzzy_index = FuzzyIndex(cache)
 
 # MAIN LOOP
 
-while True:
-    search_bar = input("SEARCH BAR: ")
-    top_n_results = get_top_n_matches(search_bar, use_cache=True)
-    [print(f"{i+1}: {r}") for i, r in enumerate(top_n_results)]
+if __name__ == "__main__":
+    while True:
+        search_bar = input("SEARCH BAR: ")
+        top_n_results = get_top_n_matches(normalize(search_bar), use_cache=True)
+        if not top_n_results:  # nothing starts with it, try typos, then anywhere in the title
+            top_n_results = get_top_n_matches(normalize(search_bar), use_cache=True, mode="fuzzy")
+        if not top_n_results:
+            top_n_results = get_top_n_matches(normalize(search_bar), use_cache=True, mode="infix")
+        [print(f"{i+1}: {r}") for i, r in enumerate(top_n_results)]
 
 # Reivew: this was an easier one, since it is simply sorting, dictionary access, and iterating through strings.
 # A very useful structure is the defaultdict(list) which makes it easy to track keys --> list automatically
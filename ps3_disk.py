@@ -0,0 +1,209 @@
+"""
+On-disk version of the ps3 autocomplete index, built once offline and opened with mmap.
+Opening it only reads the header, every query reads a handful of pages straight out of the page cache,
+so it's ready within milliseconds and any number of worker processes share 1 copy of it in memory.
+
+File layout (little-endian, every section 8 byte aligned):
+    header           magic, counts, then (offset, length) of each section below
+    term_offsets     Q * (n_terms + 1)   term i = term_blob[term_offsets[i]:term_offsets[i + 1]], sorted (utf-8)
+    term_blob        the cleaned search terms, concatenated
+    term_title_start I * (n_terms + 1)   titles of term i = term_titles[term_title_start[i]:term_title_start[i + 1]]
+    term_titles      I * n_matches       title numbers
+    title_offsets    Q * (n_titles + 1)  same as the terms, for the original titles
+    title_blob
+    popularity       d * n_titles
+    node_lo, node_hi I * n_nodes         every radix tree node (pre-order) covers the sorted terms [lo, hi)
+    node_top         i * n_nodes * top_k the node's top_k most popular title numbers, -1 padded
+
+The terms starting with a prefix are always 1 contiguous range of the sorted term table (2 binary searches),
+and that range is exactly the range of the radix tree node the prefix ends on, so node_lo/node_hi stand in for the
+tree's edges: find the node with that range and its top list is the answer.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List
+
+from ps3_trie import RadixTree, random_titles
+
+MAGIC = b"PS3IDX01"
+SECTIONS = [
+    ("term_offsets", "Q"),
+    ("term_blob", "B"),
+    ("term_title_start", "I"),
+    ("term_titles", "I"),
+    ("title_offsets", "Q"),
+    ("title_blob", "B"),
+    ("popularity", "d"),
+    ("node_lo", "I"),
+    ("node_hi", "I"),
+    ("node_top", "i"),
+]
+HEADER = struct.Struct("<8sQQQQ" + "QQ" * len(SECTIONS))
+
+
+def write_index(path: str, tree: RadixTree, names: List[str] = None):
+    # Serialize a RadixTree built with top_k (see ps3.generate_popularity_cache).
+    # The tree's title ids are stored as str, or as names[title id] if given (e.g. from ps3_loader.build_index)
+    if not tree.top_k:
+        raise ValueError("Tree was built without top_k")
+    k = tree.top_k
+    data = {name: array(typecode) for name, typecode in SECTIONS}
+    data["term_offsets"].append(0)
+    data["term_title_start"].append(0)
+    data["title_offsets"].append(0)
+    title_numbers = {}
+
+    def title_number(title) -> int:
+        number = title_numbers.get(title)
+        if number is None:
+            number = title_numbers[title] = len(title_numbers)
+            data["title_blob"].frombytes(str(title if names is None else names[title]).encode())
+            data["title_offsets"].append(len(data["title_blob"]))
+            data["popularity"].append(tree.popularity(title))
+        return number
+
+    # Iterative pre-order walk with children in sorted order, so the terms come out sorted.
+    # (node, term so far) entries go in, None marks "all children done" for the node on top of `open_nodes`.
+    n_terms = 0
+    open_nodes = []
+    stack = [(tree.root, "")]
+    while stack:
+        entry = stack.pop()
+        if entry is None:
+            data["node_hi"][open_nodes.pop()] = n_terms
+            continue
+        node, term = entry
+        open_nodes.append(len(data["node_lo"]))
+        data["node_lo"].append(n_terms)
+        data["node_hi"].append(0)
+        top = [title_number(title) for _, title in node.top or []]
+        data["node_top"].extend(top + [-1] * (k - len(top)))
+        if node.values is not None:
+            data["term_blob"].frombytes(term.encode())
+            data["term_offsets"].append(len(data["term_blob"]))
+            data["term_titles"].extend(title_number(title) for title in node.values)
+            data["term_title_start"].append(len(data["term_titles"]))
+            n_terms += 1
+        stack.append(None)
+        if node.children:
+            for label in sorted(node.children, reverse=True):
+                child = node.children[label]
+                stack.append((child, term + child.label))
+
+    n_nodes = len(data["node_lo"])
+    sections = []
+    offset = HEADER.size
+    for name, _ in SECTIONS:
+        offset += -offset % 8
+        length = len(data[name]) * data[name].itemsize
+        sections += [offset, length]
+        offset += length
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, n_terms, len(title_numbers), n_nodes, k, *sections))
+        for (name, _), section_offset in zip(SECTIONS, sections[::2]):
+            f.write(b"\0" * (section_offset - f.tell()))
+            data[name].tofile(f)
+
+
+class DiskIndex:
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_terms, self.n_titles, self.n_nodes, self.top_k, *sections = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a ps3 index")
+        view = memoryview(self.mm)
+        self.views = [view]
+        for (name, typecode), offset, length in zip(SECTIONS, sections[::2], sections[1::2]):
+            section = view[offset : offset + length].cast(typecode)
+            self.views.append(section)
+            setattr(self, name, section)
+
+    def close(self):
+        # the memoryviews have to go before the mmap can be closed
+        for view in reversed(self.views):
+            view.release()
+        self.mm.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n_terms
+
+    def term(self, i: int) -> bytes:
+        return bytes(self.term_blob[self.term_offsets[i] : self.term_offsets[i + 1]])
+
+    def title(self, number: int) -> str:
+        return bytes(self.title_blob[self.title_offsets[number] : self.title_offsets[number + 1]]).decode()
+
+    def term_range(self, prefix: str) -> (int, int):
+        # [lo, hi) of the sorted terms that start with prefix. utf-8 bytes sort in the same order as the str terms
+        p = prefix.encode()
+        lo = bisect_left(range(self.n_terms), p, key=self.term)
+        hi = bisect_right(range(self.n_terms), p, lo, key=lambda i: self.term(i)[: len(p)])
+        return lo, hi
+
+    def get(self, term: str, default=None) -> List[str]:
+        lo, hi = self.term_range(term)
+        if lo == hi or self.term(lo) != term.encode():
+            return default
+        start, end = self.term_title_start[lo], self.term_title_start[lo + 1]
+        return [self.title(number) for number in self.term_titles[start:end]]
+
+    def top(self, prefix: str, n: int = None) -> List[str]:
+        # Same as RadixTree.top
+        lo, hi = self.term_range(prefix)
+        if lo == hi:
+            return []
+        # The nodes covering [lo, ...) are consecutive in pre-order, from the widest range down
+        i = bisect_left(self.node_lo, lo)
+        while self.node_hi[i] != hi:
+            i += 1
+        top = self.node_top[i * self.top_k : (i + 1) * self.top_k]
+        return [self.title(number) for number in top[:n] if number != -1]
+
+    def popularity_of(self, number: int) -> float:
+        return self.popularity[number]
+
+
+def benchmark(n_titles: int = 1_000_000):
+    terms = random_titles(n_titles)
+    popularity = {f"title{i}": (i * 7919) % 1000 / 10 for i in range(n_titles)}
+    start = time.perf_counter()
+    tree = RadixTree.from_sorted(
+        ((term, [f"title{i}"]) for i, term in sorted(enumerate(terms), key=lambda x: x[1])),
+        top_k=10,
+        popularity=popularity.__getitem__,
+    )
+    path = os.path.join(tempfile.mkdtemp(), "ps3.idx")
+    write_index(path, tree)
+    print(f"built + wrote {os.path.getsize(path) / 1e6:.0f}MB index in {time.perf_counter() - start:.1f}s")
+
+    prefixes = [term[: (i % len(term)) + 1] for i, term in enumerate(terms[:10_000])]
+    start = time.perf_counter()
+    with DiskIndex(path) as index:
+        first = index.top(prefixes[0], 3)
+        print(f"open + first query: {(time.perf_counter() - start) * 1000:.2f}ms")
+        assert first == tree.top(prefixes[0], 3)
+        start = time.perf_counter()
+        for prefix in prefixes:
+            index.top(prefix, 3)
+        print(f"top(prefix, 3): {(time.perf_counter() - start) / len(prefixes) * 1e6:.1f}us")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
@@ -0,0 +1,229 @@
+"""
+Optional matching modes on top of the ps3 radix tree, for when forward-only matching isn't enough:
+
+  infix("lock")  --> "Bitlocker12345", "locker room", ...
+      Trigram inverted index: every term is listed under each 3 character substring it contains.
+      Only the rarest trigram of the query is scanned and each candidate is checked with a plain `in`.
+      Term ids are handed out most popular first, so the first k hits are the k most popular: stop there.
+  fuzzy("berln") --> "Berlin", ...
+      Typo tolerant prefix search: walk the radix tree carrying a row of the Levenshtein DP table
+      (edit distance between the query and the path so far), 1 row per character on the edges.
+      Once the query is within max_distance of the path, the whole subtree matches and its top list
+      (RadixTree.top_k) gives its most popular titles. A branch is dropped as soon as every entry of its row is over
+      max_distance. Nodes are expanded most popular subtree first, so the walk stops as soon as it has k results
+      nothing unexplored can beat. Distance 0 (= plain prefix match) first, then 1, then 2, until there are k results.
+
+Both take a latency budget in seconds: when it runs out the search stops and returns what it has so far,
+together with complete=False.
+"""
+
+import gc
+import heapq
+import random
+import sys
+import time
+from array import array
+from typing import List, Tuple
+
+from ps3_trie import RadixTree, random_titles
+
+
+class FuzzyIndex:
+    def __init__(self, tree: RadixTree, n: int = 3):
+        # tree has to be built with top_k (see ps3.generate_popularity_cache)
+        if not tree.top_k:
+            raise ValueError("Tree was built without top_k")
+        self.tree = tree
+        self.n = n
+        popularity = tree.popularity
+
+        found = []  # (-best popularity, term, titles most popular first)
+        stack = [(tree.root, "")]
+        while stack:
+            node, term = stack.pop()
+            if node.values is not None:
+                ranked = sorted((-popularity(title), title) for title in node.values)
+                found.append((ranked[0][0] if ranked else 0, term, ranked))
+            if node.children:
+                stack.extend((child, term + child.label) for child in node.children.values())
+        found.sort(key=lambda x: x[:2])
+        self.terms = [term for _, term, _ in found]
+        self.ranked = [ranked for _, _, ranked in found]
+
+        self.postings = {}  # trigram --> array of term ids, ascending = most popular first
+        for term_id, term in enumerate(self.terms):
+            for gram in {term[i : i + n] for i in range(len(term) - n + 1)}:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array("I")
+                posting.append(term_id)
+
+    def infix(self, query: str, k: int = 10, budget: float = 0.005) -> Tuple[List, bool]:
+        # (k most popular titles whose term contains query, complete)
+        if len(query) < self.n:
+            return self.tree.top(query, k), True  # too short to look up, 1-2 characters anywhere matches nearly everything
+        deadline = time.perf_counter() + budget
+        postings = []
+        for i in range(len(query) - self.n + 1):
+            posting = self.postings.get(query[i : i + self.n])
+            if posting is None:
+                return [], True
+            postings.append(posting)
+        rarest = min(postings, key=len)
+
+        # Terms come most popular first, but a term's 2nd title can still be beaten by the next term's best,
+        # so only stop once the k-th best so far is at least as popular as the next term's best
+        results = []
+        terms, ranked = self.terms, self.ranked
+        for i, term_id in enumerate(rarest):
+            if len(results) >= k and results[k - 1][0] <= ranked[term_id][0][0]:
+                break
+            if i & 255 == 255 and time.perf_counter() > deadline:
+                return [title for _, title in results[:k]], False
+            if query in terms[term_id]:
+                results = sorted(results + ranked[term_id])[:k]
+        return [title for _, title in results[:k]], True
+
+    def _walk(self, query: str, max_distance: int, k: int, deadline: float, skip: set) -> Tuple[List, bool]:
+        # ([(-popularity, title)] of the k most popular titles with a prefix within max_distance of query, complete)
+        # Best first: the next node to expand is the one with the most popular title below it (the head of its top
+        # list), so once we have k titles at least that popular, nothing left can beat them and we stop.
+        # Rows are banded: after i characters only query positions i +- max_distance can still be <= max_distance,
+        # so only those 2 * max_distance + 1 cells are computed, the rest stay capped at max_distance + 1.
+        root = self.tree.root
+        if not root.top:
+            return [], True
+        m = len(query)
+        cap = max_distance + 1
+        if m <= max_distance:
+            return [entry for entry in root.top if entry[1] not in skip][:k], True
+        results = []
+        heap = [(root.top[0], id(root), root, [min(j, cap) for j in range(m + 1)], 0)]
+        while heap:
+            best, _, node, row, depth = heapq.heappop(heap)
+            if len(results) >= k and results[k - 1] <= best:
+                return results, True
+            if time.perf_counter() > deadline:
+                return results, False
+            if not node.children:
+                continue
+            children = node.children.values()
+            if min(row) + 1 > max_distance:
+                # no edits left: the next character has to match the query at 1 of the positions still alive,
+                # so only look at those children instead of every one (nodes after a space can have thousands)
+                children = [
+                    node.children[c]
+                    for c in {query[j] for j in range(m) if row[j] <= max_distance}
+                    if c in node.children
+                ]
+            for n_children, child in enumerate(children, 1):
+                if n_children & 255 == 0 and time.perf_counter() > deadline:
+                    return results, False
+                r = row
+                i = depth
+                matched = False
+                alive = True
+                for ch in child.label:
+                    i += 1
+                    lo = max(1, i - max_distance)
+                    hi = min(m, i + max_distance)
+                    new = [cap] * (m + 1)
+                    new[0] = min(i, cap)
+                    lowest = new[0]
+                    for j in range(lo, hi + 1):
+                        v = r[j - 1] + (query[j - 1] != ch)
+                        if r[j] + 1 < v:
+                            v = r[j] + 1
+                        if new[j - 1] + 1 < v:
+                            v = new[j - 1] + 1
+                        if v < cap:
+                            new[j] = v
+                            if v < lowest:
+                                lowest = v
+                    r = new
+                    if r[m] <= max_distance:
+                        matched = True
+                        break
+                    if lowest > max_distance:
+                        alive = False
+                        break
+                if matched:
+                    # every title below child matches, and they are disjoint from the other hits
+                    results = sorted(results + [entry for entry in child.top if entry[1] not in skip])[:k]
+                elif alive:
+                    heapq.heappush(heap, (child.top[0], id(child), child, r, i))
+        return results, True
+
+    def fuzzy(self, query: str, k: int = 10, max_distance: int = 2, budget: float = 0.005) -> Tuple[List, bool]:
+        # (up to k titles with a prefix within max_distance edits of query, closest first then most popular, complete)
+        deadline = time.perf_counter() + budget
+        results = []
+        seen = set()
+        for distance in range(max_distance + 1):
+            if distance == 0:
+                node, _ = self.tree.find(query)
+                level, complete = ((node.top or [])[:k] if node is not None else []), True
+            else:
+                level, complete = self._walk(query, distance, k - len(results), deadline, seen)
+            for _, title in level:
+                seen.add(title)
+                results.append(title)
+            if len(results) >= k or not complete:
+                return results[:k], complete
+        return results, True
+
+
+def _percentiles(latencies: List[float]) -> str:
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    return f"p50 {p50 * 1000:.2f}ms, p99 {p99 * 1000:.2f}ms, max {latencies[-1] * 1000:.2f}ms"
+
+
+def benchmark(n_titles: int = 1_000_000, n_queries: int = 2000, budget_ms: float = 20):
+    rng = random.Random(0)
+    terms = random_titles(n_titles)
+    popularity = [rng.random() * 100 for _ in range(n_titles)]
+    start = time.perf_counter()
+    tree = RadixTree.from_sorted(
+        ((term, [i]) for i, term in sorted(enumerate(terms), key=lambda x: x[1])),
+        top_k=10,
+        popularity=popularity.__getitem__,
+    )
+    index = FuzzyIndex(tree)
+    print(f"built {tree} + {len(index.postings)} trigrams in {time.perf_counter() - start:.1f}s")
+    # The index is millions of long lived objects: without this, every full gc pass walks all of them (~1-2s stall)
+    gc.freeze()
+
+    def typo(s):
+        i = rng.randrange(len(s))
+        return s[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + s[i + 1 :]
+
+    samples = [t for t in rng.sample(terms, n_queries) if len(t) >= 6]
+    queries = {
+        "prefix": [(t[: rng.randint(3, len(t))],) for t in samples],
+        "infix": [(t[(i := rng.randrange(len(t) - 4)) : i + rng.randint(4, 6)],) for t in samples],
+        "fuzzy 1 typo": [(typo(t[: rng.randint(4, len(t))]),) for t in samples],
+        "fuzzy 2 typos": [(typo(typo(t[: rng.randint(5, len(t))])),) for t in samples],
+    }
+    budget = budget_ms / 1000
+    for mode, qs in queries.items():
+        latencies = []
+        incomplete = 0
+        for (q,) in qs:
+            start = time.perf_counter()
+            if mode == "prefix":
+                tree.top(q, 10)
+                complete = True
+            elif mode == "infix":
+                _, complete = index.infix(q, 10, budget)
+            else:
+                _, complete = index.fuzzy(q, 10, 2, budget)
+            latencies.append(time.perf_counter() - start)
+            incomplete += not complete
+        print(f"{mode:>14}: {_percentiles(latencies)}, {incomplete / len(qs):.1%} hit the {budget_ms:g}ms budget")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
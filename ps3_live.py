@@ -0,0 +1,231 @@
+"""
+Live updates for the ps3 index: add_title / remove_title / bump_popularity without rebuilding anything.
+
+Each update only touches the path from the root down to the title's term:
+  - copy-on-write: the nodes on that path are copied (the rest of the tree is shared with the old version),
+    the copies are changed, then the new root is swapped in with 1 assignment. Nodes that readers can see are never
+    changed in place, so a query that has started keeps seeing the version it started on, and never a half done update.
+  - only the top lists on that path can change. Adding a title or raising its popularity is a merge into each of them,
+    O(top_k) per node. Removing / lowering a title that was in a node's top list is the only case where we don't know
+    what comes after it, so only that node rebuilds its list from its own titles + its children's lists.
+Writers take a lock, readers don't.
+The trigram index of ps3_fuzzy.FuzzyIndex is not updated by this, the fuzzy (tree walking) mode is.
+"""
+
+import heapq
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from ps3_loader import normalize, normalize_batch
+from ps3_trie import Node, RadixTree, common_prefix_length, random_titles
+
+
+def _copy(node: Node) -> Node:
+    new = Node(node.label, node.values)
+    new.children = dict(node.children) if node.children else None
+    new.top = node.top
+    return new
+
+
+class LiveIndex:
+    def __init__(self, tree: RadixTree, popularity: Dict[str, float]):
+        # tree has to be built with top_k, from the same popularity (e.g. popularity=popularity.__getitem__)
+        if not tree.top_k:
+            raise ValueError("Tree was built without top_k")
+        self.tree = tree
+        self.popularity = popularity
+        self.lock = threading.Lock()
+        self.version = 0  # +1 per update, handy to tell whether 2 reads saw the same version
+        self.term_of = {}
+        stack = [(tree.root, "")]
+        while stack:
+            node, term = stack.pop()
+            for title in node.values or []:
+                self.term_of[title] = term
+            if node.children:
+                stack.extend((child, term + child.label) for child in node.children.values())
+
+    @classmethod
+    def from_titles(cls, titles: dict, top_k: int = 10) -> "LiveIndex":
+        # titles in the ps3.titles format: {key: {"title": ..., "url": ..., "popularity": ...}}
+        popularity = {title["title"]: title["popularity"] for title in titles.values()}
+        title_map = defaultdict(list)
+        for term, title in zip(normalize_batch(list(titles)), titles.values()):
+            title_map[term].append(title["title"])
+        return cls(RadixTree.from_title_map(title_map, top_k, popularity.__getitem__), popularity)
+
+    def snapshot(self) -> RadixTree:
+        # A read-only tree frozen at the current version, for several reads that have to agree with each other
+        tree = RadixTree(self.tree.top_k, self.tree.popularity)
+        tree.root = self.tree.root
+        tree.n_terms = self.tree.n_terms
+        return tree
+
+    def top(self, prefix: str, n: int = None) -> List[str]:
+        return self.tree.top(prefix, n)
+
+    def _copy_path(self, term: str, create: bool = False) -> List[Node]:
+        # Copies of the nodes from the root down to the node of term (created if needed), already linked to each other
+        node = _copy(self.tree.root)
+        path = [node]
+        i = 0
+        while i < len(term):
+            child = node.children.get(term[i]) if node.children else None
+            if child is None:
+                if not create:
+                    raise KeyError(term)
+                leaf = Node(term[i:])
+                node.add_child(leaf)
+                path.append(leaf)
+                return path
+            label = child.label
+            n = common_prefix_length(label, term[i:])
+            if n < len(label):
+                if not create:
+                    raise KeyError(term)
+                # split the edge: mid takes the shared part, a copy of child keeps the rest
+                rest = _copy(child)
+                rest.label = label[n:]
+                mid = Node(label[:n])
+                mid.add_child(rest)
+                mid.top = child.top
+                child = mid
+            else:
+                child = _copy(child)
+            node.children[term[i]] = child
+            path.append(child)
+            node = child
+            i += n
+        return path
+
+    def _fix_tops(self, path: List[Node], old: tuple, new: tuple):
+        # Bottom-up, so every child's list is already up to date when its parent needs it.
+        # old / new = the title's (-popularity, title) entry before / after, None if it didn't / doesn't exist
+        k = self.tree.top_k
+        for node in reversed(path):
+            top = node.top or []
+            if old is not None and old in top and (new is None or (len(top) == k and new > top[-1])):
+                # it drops out of (or down) a full list: whatever was just behind it is only known by the children
+                own = [(-self.popularity[title], title) for title in node.values or []]
+                children = [child.top for child in node.children.values() if child.top] if node.children else []
+                top = heapq.nsmallest(k, itertools.chain(own, *children))
+            else:
+                if old is not None and old in top:
+                    top = [entry for entry in top if entry != old]
+                if new is not None:
+                    top = sorted(top + [new])[:k]
+            node.top = top or None
+
+    def _publish(self, path: List[Node], n_terms: int):
+        self.tree.root = path[0]
+        self.tree.n_terms = n_terms
+        self.version += 1
+
+    def add_title(self, title: str, popularity: float):
+        with self.lock:
+            if title in self.term_of:
+                raise ValueError(f"{title!r} is already in the index")
+            term = normalize(title)
+            path = self._copy_path(term, create=True)
+            node = path[-1]
+            n_terms = self.tree.n_terms + (node.values is None)
+            node.values = (node.values or []) + [title]
+            self.popularity[title] = popularity
+            self.term_of[title] = term
+            self._fix_tops(path, None, (-popularity, title))
+            self._publish(path, n_terms)
+
+    def remove_title(self, title: str):
+        with self.lock:
+            term = self.term_of.pop(title)
+            path = self._copy_path(term)
+            node = path[-1]
+            node.values = [t for t in node.values if t != title] or None
+            n_terms = self.tree.n_terms - (node.values is None)
+            old = (-self.popularity.pop(title), title)
+            if node.values is None and len(path) > 1:
+                # keep the tree compressed: drop the node if nothing is left below it,
+                # and fold a node with no titles and only 1 child into that child
+                if not node.children:
+                    path.pop()
+                    parent = path[-1]
+                    del parent.children[node.label[0]]
+                    if not parent.children:
+                        parent.children = None
+                    node = parent
+                if len(path) > 1 and node.values is None and node.children and len(node.children) == 1:
+                    (only_child,) = node.children.values()
+                    merged = _copy(only_child)
+                    merged.label = node.label + only_child.label
+                    path[-2].children[merged.label[0]] = merged
+                    path[-1] = merged
+            self._fix_tops(path, old, None)
+            self._publish(path, n_terms)
+
+    def bump_popularity(self, title: str, delta: float):
+        # popularity[title] += delta (can be negative)
+        with self.lock:
+            path = self._copy_path(self.term_of[title])
+            old = (-self.popularity[title], title)
+            self.popularity[title] += delta
+            self._fix_tops(path, old, (-self.popularity[title], title))
+            self._publish(path, self.tree.n_terms)
+
+
+def benchmark(n_titles: int = 1_000_000, n_updates: int = 10_000):
+    rng = random.Random(0)
+    terms = random_titles(n_titles)
+    popularity = {f"{term} {i}": rng.random() * 100 for i, term in enumerate(terms)}
+    title_map = defaultdict(list)
+    for title in popularity:
+        title_map[normalize(title)].append(title)
+    start = time.perf_counter()
+    tree = RadixTree.from_title_map(title_map, 10, popularity.__getitem__)
+    rebuild = time.perf_counter() - start
+    print(f"full rebuild of {tree}: {rebuild:.1f}s")
+    live = LiveIndex(tree, popularity)
+
+    titles = list(popularity)
+    for name, update in [
+        ("bump_popularity", lambda i: live.bump_popularity(titles[i], rng.uniform(-10, 10))),
+        ("add_title", lambda i: live.add_title(f"new title {i}", rng.random() * 100)),
+        ("remove_title", lambda i: live.remove_title(titles[i])),
+    ]:
+        start = time.perf_counter()
+        for i in range(n_updates):
+            update(i)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {elapsed / n_updates * 1e6:.0f}us per update")
+
+    # readers keep querying while a writer bumps popularity, every read has to be a sorted top list
+    stop = threading.Event()
+    reads = [0]
+
+    def reader():
+        prefixes = [normalize(t)[:3] for t in titles[n_updates : n_updates + 1000]]
+        while not stop.is_set():
+            for prefix in prefixes:
+                node, _ = live.tree.find(prefix)
+                if node is not None and node.top != sorted(node.top):
+                    raise AssertionError(f"inconsistent top list for {prefix!r}")
+                reads[0] += 1
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    start = time.perf_counter()
+    for i in range(n_updates, 2 * n_updates):
+        live.bump_popularity(titles[i], rng.uniform(-10, 10))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    thread.join()
+    print(f"with a reader thread: {elapsed / n_updates * 1e6:.0f}us per update, {reads[0]} consistent reads")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
@@ -0,0 +1,141 @@
+"""
+Streaming ingestion for the ps3 index: titles + popularity from a big TSV or JSONL file, straight into a RadixTree
+without ever holding the raw corpus (or a dict of dicts like ps3.titles) in memory.
+
+    TSV:   title <tab> popularity        (an optional "title<tab>popularity" header line is skipped)
+    JSONL: {"title": ..., "popularity": ...} per line, other keys (e.g. url) are ignored
+
+Pipeline:
+  1. read_corpus() yields (title, popularity) 1 line at a time
+  2. every batch is normalized in 1 go: joined into 1 string, folded (casefold + NFKD, so "Zürich" --> "zurich"),
+     1 precompiled regex pass to drop punctuation, split back up. Equal terms are interned, so they're stored once.
+  3. the batch's (term, title number) pairs are sorted and spilled to a temp file (a "run")
+  4. heapq.merge streams all runs back in sorted order into RadixTree.from_sorted(), which builds the tree in 1 pass
+So at any point memory holds the tree being built, the title names + popularity (which the index needs anyway)
+and 1 batch, never the whole corpus.
+"""
+
+import heapq
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import unicodedata
+from array import array
+from itertools import islice
+from typing import Iterator, List, Tuple
+
+from ps3_trie import RadixTree, random_titles
+
+# Anything that isn't a letter/digit (in any script), a space or the newline between the titles of a batch.
+# Combining accents are split off by NFKD first, so they get dropped too.
+_DROP = re.compile(r"[^\w \n]|_")
+
+
+def normalize(title: str) -> str:
+    return normalize_batch([title])[0]
+
+
+def normalize_batch(titles: List[str]) -> List[str]:
+    joined = "\n".join(title.replace("\n", " ") for title in titles)
+    folded = unicodedata.normalize("NFKD", joined.casefold())
+    return [sys.intern(term) for term in _DROP.sub("", folded).split("\n")]
+
+
+def read_corpus(path: str) -> Iterator[Tuple[str, float]]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["title"], float(record["popularity"])
+        else:
+            for i, line in enumerate(f):
+                title, popularity = line.rstrip("\n").split("\t")[:2]
+                if i == 0 and popularity == "popularity":
+                    continue
+                yield title, float(popularity)
+
+
+def _read_run(f) -> Iterator[Tuple[str, int]]:
+    for line in f:
+        term, number = line.rstrip("\n").split("\t")
+        yield term, int(number)
+
+
+def build_index(
+    path: str, top_k: int = 10, batch_size: int = 200_000, tmp_dir: str = None
+) -> Tuple[RadixTree, List[str], array]:
+    # Returns (tree, names, popularity). The tree's title ids are title numbers: names[i] is the original title
+    # and popularity[i] its popularity (write_index(path, tree, names) stores the names).
+    names = []
+    popularity = array("d")
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        runs = []
+        records = read_corpus(path)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            first = len(names)
+            terms = normalize_batch([title for title, _ in batch])
+            for title, pop in batch:
+                names.append(title)
+                popularity.append(pop)
+            run = os.path.join(tmp, f"run{len(runs)}.tsv")
+            with open(run, "w", encoding="utf-8") as f:
+                f.writelines(f"{term}\t{number}\n" for term, number in sorted(zip(terms, range(first, len(names)))))
+            runs.append(run)
+            del batch, terms
+
+        files = [open(run, encoding="utf-8") for run in runs]
+        try:
+            merged = heapq.merge(*(_read_run(f) for f in files))
+            tree = RadixTree.from_sorted(
+                ((sys.intern(term), [number]) for term, number in merged), top_k, popularity.__getitem__
+            )
+        finally:
+            for f in files:
+                f.close()
+    return tree, names, popularity
+
+
+def benchmark(n_titles: int = 1_000_000):
+    import tracemalloc
+
+    path = os.path.join(tempfile.mkdtemp(), "titles.tsv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("title\tpopularity\n")
+        for i, title in enumerate(random_titles(n_titles)):
+            f.write(f"{title.title()}!\t{(i * 7919) % 1000 / 10}\n")
+    print(f"{os.path.getsize(path) / 1e6:.0f}MB corpus")
+
+    start = time.perf_counter()
+    tree, names, popularity = build_index(path)
+    elapsed = time.perf_counter() - start
+    print(f"built {tree} in {elapsed:.1f}s ({n_titles / elapsed:.0f} titles/s)")
+    del tree, names, popularity
+
+    # again under tracemalloc (a lot slower) for the memory
+    tracemalloc.start()
+    tree, names, popularity = build_index(path)
+    final, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"memory: final index {final / 1e6:.0f}MB, peak {peak / 1e6:.0f}MB")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
+    elif len(sys.argv) == 3:
+        # python ps3_loader.py titles.tsv titles.idx --> on-disk index for ps3_disk.DiskIndex
+        from ps3_disk import write_index
+
+        tree, names, _ = build_index(sys.argv[1])
+        write_index(sys.argv[2], tree, names)
+        print(f"wrote {tree} to {sys.argv[2]}")
+    else:
+        print("usage: python ps3_loader.py <corpus.tsv|corpus.jsonl> <out.idx> | bench [n_titles]")
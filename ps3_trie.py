@@ -0,0 +1,282 @@
+"""
+Compressed trie (radix tree) over the cleaned ps3 search terms.
+Every edge holds a whole run of characters instead of 1 char per node, so there's only a node where terms branch
+(or end), ~2 nodes per term instead of 1 per character.
+
+    matches(prefix, n) = walk down the edges matching the prefix (O(len(prefix))), then pop the n shortest terms
+                         below that node off a heap, shortest first like ps3.get_top_n_matches
+    top(prefix)        = with top_k set, every node keeps the top_k most popular title ids of everything below it,
+                         so "most popular for this prefix" is the same walk + 1 list, no matter how many titles match.
+                         Memory for those lists is <= top_k per node.
+
+from_sorted() builds the whole tree in 1 pass over the terms in sorted order: consecutive sorted terms share their
+longest common prefix, so each term only has to branch off the path of the term before it.
+"""
+
+import heapq
+import itertools
+import random
+import sys
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+
+class Node:
+    __slots__ = ("label", "children", "values", "top")
+
+    def __init__(self, label: str = "", values: Optional[list] = None):
+        self.label = label  # the characters on the edge coming into this node
+        self.children = None  # first character of the child's label --> child, None for leaves
+        self.values = values  # title ids of the term ending here, None if no term ends here
+        self.top = None  # [(-popularity, title id)] of the most popular titles in this subtree, best first
+
+    def add_child(self, child: "Node"):
+        if self.children is None:
+            self.children = {}
+        self.children[child.label[0]] = child
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+class RadixTree:
+    def __init__(self, top_k: int = 0, popularity: Callable = None):
+        # top_k = 0 means no per node top lists. Otherwise popularity(title id) ranks the titles.
+        if top_k and popularity is None:
+            raise ValueError("top_k needs a popularity function")
+        self.root = Node()
+        self.n_terms = 0
+        self.top_k = top_k
+        self.popularity = popularity
+
+    def _ranked(self, values) -> list:
+        return sorted((-self.popularity(v), v) for v in values)[: self.top_k]
+
+    def _merge(self, a: Optional[list], b: Optional[list]) -> list:
+        # Always a new list, so a top list can be shared between nodes as long as nobody changes it in place
+        if not a:
+            return b
+        if not b:
+            return a
+        return sorted(a + b)[: self.top_k]  # 2 sorted runs, timsort just merges them
+
+    @classmethod
+    def from_sorted(
+        cls, items: Iterable[Tuple[str, list]], top_k: int = 0, popularity: Callable = None
+    ) -> "RadixTree":
+        # items = (term, title ids) in sorted term order, e.g. sorted(title_map.items()), can be a generator.
+        # `path` is the chain of nodes spelling out the previous term, with the length of the term at the end of each.
+        # A node that gets popped off the path will never get anything else below it, so that's when its top list is
+        # final and gets merged into its parent's: the top lists are built bottom-up in the same pass.
+        tree = cls(top_k, popularity)
+        path = [(tree.root, 0)]
+        prev = None
+        for term, values in items:
+            if term == prev:  # same term again (e.g. from a stream), just more titles
+                node = path[-1][0]
+                node.values.extend(values)
+                if top_k:
+                    node.top = tree._merge(node.top, tree._ranked(values))
+                continue
+            if prev is not None and term < prev:
+                raise ValueError(f"Terms are not sorted: {term!r} after {prev!r}")
+            lcp = common_prefix_length(prev, term) if prev is not None else 0
+            # back up the path to where the new term branches off
+            while path[-1][1] > lcp:
+                node, end = path.pop()
+                start = end - len(node.label)
+                if start < lcp:
+                    # it branches off halfway along this edge: split the edge there
+                    mid = Node(node.label[: lcp - start])
+                    node.label = node.label[lcp - start :]
+                    mid.add_child(node)
+                    mid.top = node.top
+                    path[-1][0].children[mid.label[0]] = mid
+                    path.append((mid, lcp))
+                elif top_k:
+                    parent = path[-1][0]
+                    parent.top = tree._merge(parent.top, node.top)
+            parent = path[-1][0]
+            if lcp == len(term):  # only the empty term can end exactly at the branch point in sorted order
+                parent.values = list(values)
+                if top_k:
+                    parent.top = tree._ranked(values)
+            else:
+                leaf = Node(term[lcp:], list(values))
+                if top_k:
+                    leaf.top = tree._ranked(values)
+                parent.add_child(leaf)
+                path.append((leaf, len(term)))
+            tree.n_terms += 1
+            prev = term
+        if top_k:
+            while len(path) > 1:
+                node, _ = path.pop()
+                parent = path[-1][0]
+                parent.top = tree._merge(parent.top, node.top)
+        return tree
+
+    @classmethod
+    def from_title_map(cls, title_map, top_k: int = 0, popularity: Callable = None) -> "RadixTree":
+        return cls.from_sorted(sorted(title_map.items()), top_k, popularity)
+
+    def __len__(self):
+        return self.n_terms
+
+    def __repr__(self):
+        return f"RadixTree({self.n_terms} terms, {self.n_nodes()} nodes)"
+
+    def n_nodes(self) -> int:
+        count = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            count += 1
+            if node.children:
+                stack.extend(node.children.values())
+        return count
+
+    def insert(self, term: str, values: list):
+        # Add 1 term at a time (unsorted), splitting an edge where the term branches off in the middle of it.
+        # Every node on the way down gets the new titles merged into its top list.
+        ranked = self._ranked(values) if self.top_k else None
+        node = self.root
+        i = 0
+        while True:
+            if self.top_k:
+                node.top = self._merge(node.top, ranked)
+            if i == len(term):
+                break
+            child = node.children.get(term[i]) if node.children else None
+            if child is None:
+                leaf = Node(term[i:], list(values))
+                leaf.top = ranked
+                node.add_child(leaf)
+                self.n_terms += 1
+                return
+            label = child.label
+            n = common_prefix_length(label, term[i:])
+            if n < len(label):
+                mid = Node(label[:n])
+                child.label = label[n:]
+                mid.add_child(child)
+                mid.top = child.top
+                node.children[label[0]] = mid
+                child = mid
+            node = child
+            i += n
+        if node.values is None:
+            node.values = list(values)
+            self.n_terms += 1
+        else:
+            node.values.extend(values)
+
+    def find(self, prefix: str) -> Tuple[Optional[Node], str]:
+        # The highest node whose terms all start with prefix, and the string spelled out down to it. O(len(prefix))
+        node = self.root
+        i = 0
+        while i < len(prefix):
+            child = node.children.get(prefix[i]) if node.children else None
+            if child is None:
+                return None, ""
+            label = child.label
+            if prefix.startswith(label, i):
+                i += len(label)
+                node = child
+            elif label.startswith(prefix[i:]):
+                return child, prefix[:i] + label  # the prefix stops halfway along this edge
+            else:
+                return None, ""
+        return node, prefix
+
+    def get(self, term: str, default=None):
+        node, path = self.find(term)
+        if node is None or path != term or node.values is None:
+            return default
+        return node.values
+
+    def __contains__(self, term: str) -> bool:
+        return self.get(term) is not None
+
+    def top(self, prefix: str, n: int = None) -> list:
+        # The most popular title ids starting with prefix, best first. Needs top_k, and n can't be more than top_k
+        if not self.top_k:
+            raise ValueError("Tree was built without top_k")
+        node, _ = self.find(prefix)
+        if node is None or not node.top:
+            return []
+        return [title for _, title in node.top[:n]]
+
+    def matches(self, prefix: str, n: int = 10) -> List[Tuple[str, list]]:
+        # [(term, title ids)] for terms starting with prefix, shortest first (ties alphabetically), n=-1 for all
+        node, path = self.find(prefix)
+        if node is None:
+            return []
+        matched = []
+        heap = [(len(path), path, node)]
+        while heap and len(matched) != n:
+            _, term, node = heapq.heappop(heap)
+            if node.values is not None:
+                matched.append((term, node.values))
+            if node.children:
+                for child in node.children.values():
+                    child_term = term + child.label
+                    heapq.heappush(heap, (len(child_term), child_term, child))
+        return matched
+
+
+def random_titles(n_titles: int, seed: int = 0) -> List[str]:
+    # Title-ish strings: 1-4 words out of a made up vocabulary with a skewed word frequency
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = ["".join(rng.choices(letters, k=rng.randint(2, 10))) for _ in range(50_000)]
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(vocabulary))))
+    return [
+        " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(1, 4)))
+        for _ in range(n_titles)
+    ]
+
+
+def benchmark(n_titles: int = 1_000_000):
+    terms = random_titles(n_titles)
+    start = time.perf_counter()
+    tree = RadixTree.from_sorted((term, [i]) for i, term in enumerate(sorted(terms)))
+    elapsed = time.perf_counter() - start
+    print(f"built {tree} from {n_titles} titles in {elapsed:.1f}s ({n_titles / elapsed:.0f} titles/s)")
+
+    prefixes = [term[: random.Random(i).randint(1, len(term))] for i, term in enumerate(terms[:10_000])]
+    start = time.perf_counter()
+    for prefix in prefixes:
+        tree.matches(prefix, 10)
+    print(f"matches(prefix, 10): {(time.perf_counter() - start) / len(prefixes) * 1e6:.1f}us")
+
+    rng = random.Random(1)
+    popularity = [rng.random() * 100 for _ in range(n_titles)]
+    start = time.perf_counter()
+    tree = RadixTree.from_sorted(
+        ((term, [i]) for i, term in enumerate(sorted(terms))), top_k=10, popularity=popularity.__getitem__
+    )
+    print(f"built with top 10 per node in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    for prefix in prefixes:
+        tree.top(prefix, 3)
+    print(f"top(prefix, 3): {(time.perf_counter() - start) / len(prefixes) * 1e6:.1f}us")
+
+    # what ps3.get_top_n_matches used to do: scan every term
+    unique_terms = list(dict.fromkeys(terms))
+    start = time.perf_counter()
+    for prefix in prefixes[:20]:
+        matched = [term for term in unique_terms if term.startswith(prefix)]
+        matched.sort(key=len)
+    print(f"linear scan: {(time.perf_counter() - start) / 20 * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
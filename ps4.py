@@ -5,69 +5,363 @@ How would you design a program to provide this basic key-value storage?
 """
 
 import bisect
+import random
+import sys
+import threading
 import time
+import tracemalloc
+from array import array
 from collections import OrderedDict, defaultdict
 
+from ps4_values import ValueStore
+
 
 def ts():
     return int(time.time()*10000000)
 
+class Timeline:
+    # The versions of 1 key as 2 parallel arrays instead of a list of (ts, value id) tuples:
+    # 12 bytes per version (up to 2x that with the spare capacity) instead of ~70,
+    # and bisect runs straight on the timestamps, no key function.
+    # Readers take no lock: slots [0, n) never change once n covers them, so a reader reads n first and only looks
+    # below it. The writer fills slot n, then bumps n. A full timeline is copied into a new one twice the size, which
+    # replaces it in Config.values, and readers still holding the old one keep a consistent (older) view.
+    __slots__ = ("ts", "ids", "n")
+
+    def __init__(self, capacity: int = 2):
+        self.ts = array("q", bytes(8 * capacity)) # ascending
+        self.ids = array("I", bytes(4 * capacity)) # value ids in the ValueStore
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        n = self.n
+        return f"Timeline({list(zip(self.ts[:n], self.ids[:n]))})"
+
+    def grown(self) -> "Timeline":
+        new = Timeline(0)
+        n = self.n
+        new.ts = self.ts[:n] + array("q", bytes(8 * max(n, 2)))
+        new.ids = self.ids[:n] + array("I", bytes(4 * max(n, 2)))
+        new.n = n
+        return new
+
+    def append(self, timestamp: int, value_id: int):
+        # writer only, and only while len(self) < capacity (see grown)
+        n = self.n
+        self.ts[n] = timestamp
+        self.ids[n] = value_id
+        self.n = n + 1 # publish
+
+    def latest(self):
+        n = self.n
+        return self.ids[n - 1] if n else None
+
+    def at(self, timestamp: int):
+        # id of the value as of timestamp, None if the key didn't exist yet
+        i = bisect.bisect_right(self.ts, timestamp, 0, self.n)
+        return self.ids[i - 1] if i else None
+
+
+class Snapshot:
+    # Read-only view of the whole config as of 1 timestamp (MVCC style): nothing is copied when it's made.
+    # get() resolves 1 key from its timeline, materialize() rebuilds every key at once from the nearest checkpoint.
+    # Writers only ever append versions with later timestamps, so what a view sees never changes and it needs no lock.
+    # The change log arrays are appended to in an order (key + value id first, ts last) that makes every position
+    # below bisect(log_ts) complete.
+    def __init__(self, config: "Config", timestamp: int):
+        self.config = config
+        self.timestamp = timestamp
+        self.value_ids = None # key --> value id, once materialized
+
+    def __repr__(self):
+        return f"Snapshot(ts={self.timestamp})"
+
+    def get(self, key, default=None):
+        if self.value_ids is not None:
+            value_id = self.value_ids.get(key)
+        else:
+            versions = self.config.values.get(key)
+            value_id = versions.at(self.timestamp) if versions is not None else None
+        return default if value_id is None else self.config.store.get(value_id)
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, self) is not self
+
+    def materialize(self) -> dict:
+        # key --> value id for every key that existed at the timestamp:
+        # the nearest checkpoint at or before it + the change log since, O(keys + changes since that checkpoint)
+        if self.value_ids is None:
+            config = self.config
+            end = bisect.bisect_right(config.log_ts, self.timestamp)
+            start, state = config.checkpoints[bisect.bisect_right(config.checkpoint_pos, end) - 1]
+            value_ids = {config.keys[key_id]: value_id for key_id, value_id in enumerate(state) if value_id != -1}
+            for i in range(start, end):
+                value_ids[config.keys[config.log_keys[i]]] = config.log_ids[i]
+            self.value_ids = value_ids
+        return self.value_ids
+
+    def keys(self):
+        return self.materialize().keys()
+
+    def items(self):
+        store = self.config.store
+        return [(key, store.get(value_id)) for key, value_id in self.materialize().items()]
+
+    def __len__(self):
+        return len(self.materialize())
+
+
 class Config:
-    def __init__(self):
-        self.values = defaultdict(list) # versioning will use timestamp of addition for simplicity.
+    # Thread safe for any number of readers and a few writers: writers take write_lock, readers (get, get_many,
+    # snapshot) take no lock at all, see Timeline. Iterating over self.values while writers add keys isn't safe.
+    def __init__(self, checkpoint_every: int = 10_000):
+        self.values = {} # key --> Timeline. versioning will use timestamp of addition for simplicity.
+        self.store = ValueStore() # every distinct value is stored once, versions are (ts, value id)
+        # global change log of every version in time order, keys by id
+        self.key_ids = {}
+        self.keys = []
+        self.log_ts = array("q")
+        self.log_keys = array("I")
+        self.log_ids = array("I")
+        # every checkpoint_every changes: (log position, value id per key id then, -1 = no such key yet)
+        self.checkpoint_every = checkpoint_every
+        self.current = array("i")
+        self.checkpoints = [(0, array("i"))]
+        self.checkpoint_pos = [0]
+        self.write_lock = threading.Lock()
     
-    def add(self, key, value):
-       
+    def add(self, key, value, timestamp: int = None):
+        # Returns the timestamp of the new version, None if the value didn't change.
+        # timestamp is only for replaying versions that already have one (see ps4_wal), it has to be the latest yet.
+        with self.write_lock:
+            return self._add(key, value, timestamp)
+
+    def _add(self, key, value, timestamp: int = None):
+        # bisect (Timeline.at, snapshots) only works while every timestamp array stays sorted
+        if timestamp is not None and self.log_ts and timestamp <= self.log_ts[-1]:
+            raise ValueError(f"timestamp {timestamp} is not after the latest version ({self.log_ts[-1]})")
+
         # Add the incoming value as the hash
-        self.values[key].append((ts(), value))
+        versions = self.values.get(key)
+        if versions is None:
+            versions = Timeline()
+        latest = versions.latest()
+        value_id = self.store.put(value, base=latest) # big values are stored as a delta against the latest one
+        if value_id == latest:
+            return None # same value as now, not a new version
+        now = timestamp if timestamp is not None else self._next_timestamp()
+        if len(versions) == len(versions.ts):
+            versions = versions.grown()
+        versions.append(now, value_id)
+        self.values[key] = versions # publish (a no-op unless it's new or grown)
+
+        key_id = self.key_ids.get(key)
+        if key_id is None:
+            key_id = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.current.append(-1)
+        self.current[key_id] = value_id
+        # the ts goes last: it's what readers bisect, so it has to be the last thing that appears
+        self.log_keys.append(key_id)
+        self.log_ids.append(value_id)
+        self.log_ts.append(now)
+        if len(self.log_ts) % self.checkpoint_every == 0:
+            self.checkpoints.append((len(self.log_ts), array("i", self.current)))
+            self.checkpoint_pos.append(len(self.log_ts)) # same here, checkpoint_pos is bisected
+        return now
+
+    def _next_timestamp(self) -> int:
+        # timestamps have to go strictly up for the log + snapshots, even for 2 writes within 1 clock tick
+        return max(ts(), self.log_ts[-1] + 1) if self.log_ts else ts()
+
+    def snapshot(self, timestamp: int = None) -> Snapshot:
+        # the whole config as of timestamp, now if None.
+        # A timestamp past the latest version is clamped to it: versions added later get later timestamps,
+        # so they stay out of the view instead of showing up in it.
+        latest = self.log_ts[-1] if self.log_ts else 0
+        return Snapshot(self, latest if timestamp is None else min(timestamp, latest))
 
         
     def get(self, key, timestamp: int = None): # unix timestamp
+        # latest value, or the value as of timestamp. None if the key didn't exist (yet)
+        versions = self.values.get(key)
+        if versions is None:
+            return None
         if timestamp is None:
-            # just return the latest value
-            return self.values.get(key, [])[-1][1] # since this is a tuple
-        else:
-            versions = self.values.get(key, [])
-            # Search for the latest tuple whose timestamp is < ts
-            # example: [ts1, ts2, ts3, ts4] 
-            # if my ts provided is between  ts2<>ts3, i want the insertion point that is after ts2 --> bisect_right
-            insertion_pt = bisect.bisect_right(versions, timestamp, key=lambda x: x[0]) # ts is the first item in the tuple
-            if insertion_pt ==0 : # this means that there was nothing submitted before this time, so i cant return anything
-                print("timestamp is before any known version, no values returned")
-                return None
+            return self.store.get(versions.latest())
+        # latest version whose timestamp is <= ts (bisect_right inside Timeline.at), None if it's before any version
+        value_id = versions.at(timestamp)
+        return None if value_id is None else self.store.get(value_id)
+
+    def get_many(self, keys, timestamp: int = None) -> list:
+        # [value of each key as of timestamp (latest if None)], None for a key that didn't exist yet.
+        # 1 bisect per key on its timestamp array, and every distinct value id is only decoded once.
+        values = self.values
+        value_ids = []
+        for key in keys:
+            versions = values.get(key)
+            if versions is None:
+                value_ids.append(None)
+            elif timestamp is None:
+                value_ids.append(versions.latest())
             else:
-                latest_value_idx = insertion_pt - 1
-                
-                last_versioned_value = versions[latest_value_idx]
-                print(f"found value: {last_versioned_value[1]} at ts: {last_versioned_value[0]}")
-                return last_versioned_value[1] # return only the value
-    
-        
+                value_ids.append(versions.at(timestamp))
+        decoded = {value_id: self.store.get(value_id) for value_id in set(value_ids) if value_id is not None}
+        decoded[None] = None
+        return [decoded[value_id] for value_id in value_ids]
 
-config = Config()
 
-changes = [
-    ("abc", "firstval"),
-    ("abc", "secondval"),
-    ("cba", "thirdval"),
-    ("abc", "newval"),
-]
+def benchmark(n_keys: int = 10_000, n_versions: int = 100):
+    # time travel reads + memory of the version history, against the old list of (ts, value) tuples per key
+    rng = random.Random(0)
+    writes = [(f"key{rng.randrange(n_keys)}", f"value{i}") for i in range(n_keys * n_versions)]
 
-# while True:
-#     k = str(input("Key: "))
-#     v = input("Value: ")
+    tracemalloc.start()
+    config = Config()
+    for key, value in writes:
+        config.add(key, value)
+    timelines = tracemalloc.get_traced_memory()[0]
+    old = defaultdict(list)
+    for key, versions in config.values.items():
+        old[key] = list(zip(versions.ts[: len(versions)], versions.ids[: len(versions)]))
+    tuples = tracemalloc.get_traced_memory()[0] - timelines
+    tracemalloc.stop()
+    history = sum(sys.getsizeof(v.ts) + sys.getsizeof(v.ids) for v in config.values.values())
+    print(f"{len(writes)} versions: {history / len(writes):.1f} bytes per version in arrays, "
+          f"{tuples / len(writes):.1f} as (ts, value id) tuples")
 
-#     config.add(k,v)
+    first, last = min(v.ts[0] for v in config.values.values()), max(v.ts[len(v) - 1] for v in config.values.values())
+    queries = [(f"key{rng.randrange(n_keys)}", rng.randint(first, last)) for _ in range(100_000)]
+    start = time.perf_counter()
+    for key, timestamp in queries:
+        bisect.bisect_right(old[key], timestamp, key=lambda x: x[0])
+    print(f"bisect with key=lambda on tuples: {(time.perf_counter() - start) / len(queries) * 1e9:.0f}ns")
+    start = time.perf_counter()
+    for key, timestamp in queries:
+        config.values[key].at(timestamp)
+    print(f"Timeline.at: {(time.perf_counter() - start) / len(queries) * 1e9:.0f}ns")
+    start = time.perf_counter()
+    for key, timestamp in queries:
+        config.get(key, timestamp)
+    print(f"get(key, ts) (Timeline.at + decode): {(time.perf_counter() - start) / len(queries) * 1e9:.0f}ns")
+    keys = list(config.values)
+    start = time.perf_counter()
+    config.get_many(keys, (first + last) // 2)
+    print(f"get_many({len(keys)} keys): {(time.perf_counter() - start) / len(keys) * 1e9:.0f}ns per key")
 
-times = []
-for c in changes:
-    config.add(c[0], c[1])
-    times.append(ts())
-    print(config.get(c[0]))
-    print(config.values)
-    
-# also try to get an older version of `abc`
-print(config.get('abc', times[0]))
+    # whole config at a past time: from the nearest checkpoint vs 1 bisect per key
+    timestamps = [rng.randint(first, last) for _ in range(20)]
+    start = time.perf_counter()
+    for timestamp in timestamps:
+        config.snapshot(timestamp).materialize()
+    print(f"snapshot(ts).materialize(): {(time.perf_counter() - start) / len(timestamps) * 1000:.1f}ms")
+    start = time.perf_counter()
+    for timestamp in timestamps:
+        {key: versions.at(timestamp) for key, versions in config.values.items()}
+    print(f"Timeline.at for every key: {(time.perf_counter() - start) / len(timestamps) * 1000:.1f}ms")
+
+
+def benchmark_threads(n_keys: int = 10_000, n_readers: int = 4, n_writers: int = 2, seconds: float = 2.0):
+    # read throughput of n_readers threads, alone and while n_writers threads keep writing.
+    # Every read is also checked: the value belongs to the key, and a read at a fixed past time never changes.
+    config = Config()
+    for i in range(n_keys):
+        config.add(f"key{i}", f"key{i}=0")
+    past = config.snapshot().timestamp
+    keys = [f"key{i}" for i in range(n_keys)]
+
+    def run(with_writers: bool) -> (int, int):
+        stop = threading.Event()
+        reads = [0] * n_readers
+        writes = [0] * n_writers
+        errors = []
+
+        def reader(r):
+            rng = random.Random(r)
+            count = 0
+            while not stop.is_set():
+                for key in rng.sample(keys, 100):
+                    value = config.get(key)
+                    versions = config.values[key]
+                    if not value.startswith(key + "=") or config.store.get(versions.at(past)) != key + "=0":
+                        errors.append((key, value))
+                count += 100
+            reads[r] = count
+
+        def writer(w):
+            rng = random.Random(-1 - w)
+            count = 0
+            while not stop.is_set():
+                key = rng.choice(keys)
+                config.add(key, f"{key}={rng.randrange(1, 10**9)}")
+                count += 1
+            writes[w] = count
+
+        threads = [threading.Thread(target=reader, args=(r,)) for r in range(n_readers)]
+        if with_writers:
+            threads += [threading.Thread(target=writer, args=(w,)) for w in range(n_writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise AssertionError(f"{len(errors)} inconsistent reads, e.g. {errors[0]}")
+        return sum(reads), sum(writes)
+
+    reads, _ = run(with_writers=False)
+    print(f"{n_readers} readers: {reads / seconds:.0f} reads/s")
+    reads, writes = run(with_writers=True)
+    print(f"{n_readers} readers + {n_writers} writers: {reads / seconds:.0f} reads/s, {writes / seconds:.0f} writes/s")
+
+
+def demo():
+    config = Config()
+
+    changes = [
+        ("abc", "firstval"),
+        ("abc", "secondval"),
+        ("cba", "thirdval"),
+        ("abc", "secondval"), # no change --> no new version
+        ("abc", "newval"),
+    ]
+
+    # while True:
+    #     k = str(input("Key: "))
+    #     v = input("Value: ")
+
+    #     config.add(k,v)
+
+    times = []
+    for c in changes:
+        config.add(c[0], c[1])
+        times.append(ts())
+        print(config.get(c[0]))
+        print(config.values)
+        
+    # also try to get an older version of `abc`
+    print(config.get('abc', times[0]))
+    print(config.get_many(["abc", "cba", "xyz"], times[0]))
+    print(config.snapshot(times[2]).items())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench_threads":
+        benchmark_threads(*[int(x) for x in sys.argv[2:]])
+    else:
+        demo()
 """
 A critical new feature is the ability to audit changes and retrieve historical values. 
 We need to be able to query the value of any key as it was at a specific point in time. 
@@ -92,4 +386,6 @@ How could you re-architect the storage mechanism to be more memory-efficient?
 
 """
 
-# In my above design, it already accounted for the fact that i do NOT want to copy paste the full config each time any version is changed, i onyl track the hash(values) AND only add a new entry to the key if the value was changed. So this issue shuold be handled by that design. 
\ No newline at end of file
+# In my above design, it already accounted for the fact that i do NOT want to copy paste the full config each time any version is changed, i onyl track the hash(values) AND only add a new entry to the key if the value was changed. So this issue shuold be handled by that design.
+# Now done in Config.add (see ps4_values.ValueStore): values are stored once by content hash and versions only keep
+# (ts, value id), a write of the current value is skipped, and big values are stored as a delta against the previous one. 
\ No newline at end of file
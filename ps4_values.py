@@ -0,0 +1,163 @@
+"""
+Content-addressed value store for ps4.Config: every distinct value is stored once and versions only hold its id.
+
+    put(value)  --> id   hashes the value's bytes (blake2b), an already known value just gets its existing id back
+    get(id)     --> value
+
+Large values (>= DELTA_MIN bytes) that are a new version of an earlier value are stored as a delta against it:
+(base id, length of the common prefix, length of the common suffix, the bytes in between). Config edits usually
+change a small part of a big blob, so that's a few bytes instead of a full copy. Rebuilding a value follows its chain
+of deltas back to a full copy, so chains are capped at MAX_CHAIN and the most recently rebuilt values are cached.
+
+put() is for 1 writer at a time (ps4.Config holds its write_lock), get() can run on any number of threads without a
+lock: a value's blob is stored before its id is handed out, and only adding to the cache takes a (small) lock.
+"""
+
+import hashlib
+import pickle
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+DELTA_MIN = 256  # smaller values are always stored whole, a delta wouldn't save much
+MAX_CHAIN = 16  # at most this many deltas to apply to rebuild a value
+
+
+def encode(value: Any) -> bytes:
+    # 1 byte type tag + the bytes, so the value comes back as the same type
+    if isinstance(value, str):
+        return b"s" + value.encode()
+    if isinstance(value, bytes):
+        return b"b" + value
+    return b"p" + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode(data: bytes) -> Any:
+    tag, body = data[:1], data[1:]
+    if tag == b"s":
+        return body.decode()
+    if tag == b"b":
+        return bytes(body)
+    return pickle.loads(body)
+
+
+def make_delta(base: bytes, data: bytes) -> (int, int, bytes):
+    # (prefix, suffix, middle) such that data == base[:prefix] + middle + base[len(base) - suffix:]
+    # binary search on slice compares (memcmp) instead of a python loop over every byte
+    limit = min(len(base), len(data))
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if base[:mid] == data[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    prefix = lo
+    lo, hi = 0, limit - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if base[len(base) - mid :] == data[len(data) - mid :]:
+            lo = mid
+        else:
+            hi = mid - 1
+    suffix = lo
+    return prefix, suffix, data[prefix : len(data) - suffix]
+
+
+class ValueStore:
+    def __init__(self, cache_size: int = 256):
+        self.ids = {}  # digest --> id
+        self.blobs = []  # id --> full bytes, or (base id, prefix, suffix, middle) for a delta
+        self.depth = []  # id --> number of deltas to apply to rebuild it, 0 for full bytes
+        self.cache = OrderedDict()  # id --> bytes of the most recently rebuilt deltas, oldest first
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.blobs)
+
+    def find(self, data: bytes) -> Optional[int]:
+        # id of an already stored value, by its encode() bytes
+        return self.ids.get(hashlib.blake2b(data, digest_size=16).digest())
+
+    def put(self, value: Any, base: Optional[int] = None) -> int:
+        # id of value, stored if it's new. base = id of the value it replaces, to store it as a delta against that
+        data = encode(value)
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        value_id = self.ids.get(digest)
+        if value_id is not None:
+            return value_id
+        value_id = len(self.blobs)
+        blob, depth = data, 0
+        if base is not None and len(data) >= DELTA_MIN and self.depth[base] < MAX_CHAIN:
+            prefix, suffix, middle = make_delta(self.data(base), data)
+            if len(middle) < len(data) // 2:
+                blob, depth = (base, prefix, suffix, middle), self.depth[base] + 1
+        self.depth.append(depth)
+        self.blobs.append(blob)
+        self.ids[digest] = value_id
+        return value_id
+
+    def data(self, value_id: int, use_cache: bool = True) -> bytes:
+        # use_cache=False leaves the cache alone, for a reader on another thread than the writer (e.g. compaction)
+        blob = self.blobs[value_id]
+        if isinstance(blob, bytes):
+            return blob
+        if use_cache:
+            data = self.cache.get(value_id)  # no move_to_end: a hit doesn't change the cache, so it needs no lock
+            if data is not None:
+                return data
+        base, prefix, suffix, middle = blob
+        base_data = self.data(base, use_cache)
+        data = base_data[:prefix] + middle + base_data[len(base_data) - suffix :]
+        if use_cache:
+            with self.cache_lock:
+                self.cache[value_id] = data
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return data
+
+    def get(self, value_id: int) -> Any:
+        return decode(self.data(value_id))
+
+    def nbytes(self) -> int:
+        # rough memory of the stored values (bytes + the delta tuples + the digest table), without the cache
+        total = sys.getsizeof(self.blobs) + sys.getsizeof(self.depth) + sys.getsizeof(self.ids)
+        for blob in self.blobs:
+            total += sys.getsizeof(blob) + (0 if isinstance(blob, bytes) else sys.getsizeof(blob[3]))
+        return total + len(self.ids) * (33 + 28)  # digest bytes + int id
+
+
+def benchmark(n_keys: int = 1000, n_writes: int = 100_000, value_size: int = 2000):
+    # Config-like workload: most writes don't change anything, the rest edit a few bytes of a big value
+    from ps4 import Config
+
+    rng = random.Random(0)
+    current = {f"key{i}": "".join(rng.choices("abcdef", k=value_size)) for i in range(n_keys)}
+    writes = []
+    for _ in range(n_writes):
+        key = f"key{rng.randrange(n_keys)}"
+        if rng.random() < 0.2:
+            i = rng.randrange(value_size - 10)
+            current[key] = current[key][:i] + str(rng.randrange(10**9)) + current[key][i + 10 :]
+        writes.append((key, current[key]))
+
+    config = Config()
+    start = time.perf_counter()
+    for key, value in writes:
+        config.add(key, value)
+    elapsed = time.perf_counter() - start
+    n_versions = sum(len(versions) for versions in config.values.values())
+    raw = sum(sys.getsizeof(value) for _, value in writes)
+    print(f"{n_writes} writes in {elapsed:.2f}s: {n_versions} versions, {len(config.store)} values")
+    print(f"values: {config.store.nbytes() / 1e6:.1f}MB, one copy per write would be {raw / 1e6:.1f}MB")
+    for key in list(current)[:100]:
+        assert config.get(key) == current[key]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])
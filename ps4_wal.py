@@ -0,0 +1,424 @@
+"""
+Persistence for ps4.Config: an append-only write-ahead log + compacted segment files, all in 1 directory.
+
+    wal-<n>.log      every version as it's added: crc32 | length | ts | key length | key | value (ps4_values.encode)
+    segment-<n>.seg  everything from the wal files before wal-<n>, after retention, sorted by key then ts:
+                     magic | versions: (ts, value length, value)... | index: (key length, key, offset, count)...
+                     | index offset, n keys, magic
+
+Group commit: add() writes its record into the file buffer and waits until a flusher thread has fsynced past it.
+Each fsync covers every record written before it started, so N writers waiting at the same time share 1 fsync
+instead of paying 1 each. add(sync=False) doesn't wait at all (durable within ~1 fsync).
+
+Recovery = load the newest segment, then replay the wal files from its number on. A crash halfway through a record
+leaves a torn tail that fails its crc: the log is cut off there, every record before it was complete.
+
+Compaction (every compact_after records, on a background thread): switch to a new wal file, write every version so far
+that passes the retention policy into a new segment (temp file + fsync + rename, so it's all or nothing), then delete
+the older segment and wal files. The directory is fsynced after every file is created, renamed or deleted, so those
+steps survive a crash too. Retention only applies to what's on disk, the history in memory is trimmed the next
+time it's recovered. keep_seconds is measured back from when the compaction runs. If a compaction fails, the files it
+would have replaced are left as they were, and the next add/compact/close raises the error.
+"""
+
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from typing import Iterator, Optional, Tuple
+
+from ps4 import Config, ts
+from ps4_values import decode, encode
+
+RECORD = struct.Struct("<II")  # crc32 of the body, body length
+BODY = struct.Struct("<qH")  # ts, key length, then key + value
+SEGMENT_MAGIC = b"PS4SEG01"
+VERSION = struct.Struct("<qI")  # ts, value length, then the value
+INDEX_ENTRY = struct.Struct("<QI")  # after the key: offset of its first version, number of versions
+FOOTER = struct.Struct("<QQ8s")  # index offset, number of keys, magic
+
+
+def fsync_dir(path: str):
+    # a new, renamed or deleted file is only durable once its directory entry is: fsync the directory too
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def key_bytes(key: str) -> bytes:
+    # keys are stored as utf-8 with a 2 byte length
+    if not isinstance(key, str):
+        raise TypeError(f"keys have to be str, not {type(key).__name__}")
+    data = key.encode()
+    if len(data) > 0xFFFF:
+        raise ValueError(f"key is {len(data)} bytes, at most {0xFFFF} fit")
+    return data
+
+
+class WAL:
+    def __init__(self, path: str, commit_delay: float = 0.0):
+        # commit_delay: how long the flusher waits before an fsync for more writers to join the group
+        self.path = path
+        self.file = open(path, "ab")
+        fsync_dir(os.path.dirname(path) or ".")
+        self.commit_delay = commit_delay
+        self.cond = threading.Condition()
+        self.sync_lock = threading.Lock()  # held around an fsync, so the file can't be switched underneath it
+        self.written = 0  # records written to the file buffer
+        self.durable = 0  # records fsynced
+        self.n_syncs = 0
+        self.closed = False
+        self.error = None  # once a write or fsync fails, the log can't be trusted: everything after raises it
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+
+    def append(self, timestamp: int, key: bytes, data: bytes) -> int:
+        # Buffered, not durable yet: returns the record's number for wait(). key = key_bytes(key)
+        body = BODY.pack(timestamp, len(key)) + key + data
+        record = RECORD.pack(zlib.crc32(body), len(body)) + body
+        with self.cond:
+            if self.error is not None:
+                raise self.error
+            try:
+                self.file.write(record)
+            except BaseException as e:
+                # maybe half written: a record after it would be lost behind the torn one on replay
+                self.error = e
+                self.cond.notify_all()
+                raise
+            self.written += 1
+            self.cond.notify_all()
+            return self.written
+
+    def wait(self, number: int):
+        # until record `number` is on disk, raises what the flusher hit if it failed instead
+        with self.cond:
+            while self.durable < number:
+                if self.error is not None:
+                    raise self.error
+                self.cond.wait()
+
+    def _sync(self):
+        with self.sync_lock:
+            with self.cond:
+                self.file.flush()
+                target = self.written
+            os.fsync(self.file.fileno())  # without self.cond: writers keep appending to the next group meanwhile
+            with self.cond:
+                self.durable = max(self.durable, target)
+                self.n_syncs += 1
+                self.cond.notify_all()
+
+    def _flush_loop(self):
+        while True:
+            with self.cond:
+                while self.durable == self.written and not self.closed:
+                    self.cond.wait()
+                if self.closed and self.durable == self.written:
+                    return
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            try:
+                self._sync()
+            except BaseException as e:
+                # no retrying: after a failed fsync the kernel may have dropped the dirty pages, the log is suspect
+                with self.cond:
+                    self.error = e
+                    self.cond.notify_all()
+                return
+
+    def switch(self, path: str):
+        # carry on in a new file, everything in the old one is synced first
+        with self.sync_lock:
+            with self.cond:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.durable = self.written
+                self.file.close()
+                self.file = open(path, "ab")
+                fsync_dir(os.path.dirname(path) or ".")
+                self.path = path
+                self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.flusher.join()
+        self.file.close()
+
+
+def replay(path: str) -> Iterator[Tuple[int, str, bytes]]:
+    # (ts, key, encoded value) of every complete record, a torn tail is cut off the file
+    with open(path, "rb") as f:
+        data = f.read()
+    position = 0
+    while position + RECORD.size <= len(data):
+        crc, length = RECORD.unpack_from(data, position)
+        body = data[position + RECORD.size : position + RECORD.size + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            break
+        timestamp, key_length = BODY.unpack_from(body)
+        key_end = BODY.size + key_length
+        yield timestamp, body[BODY.size : key_end].decode(), body[key_end:]
+        position += RECORD.size + length
+    if position < len(data):
+        with open(path, "r+b") as f:
+            f.truncate(position)
+            os.fsync(f.fileno())
+
+
+def write_segment(path: str, versions: Iterator[Tuple[str, list]]):
+    # versions = (key, [(ts, encoded value)] oldest first) in key order
+    tmp = path + ".tmp"
+    index = []
+    with open(tmp, "wb") as f:
+        f.write(SEGMENT_MAGIC)
+        for key, key_versions in versions:
+            index.append((key, f.tell(), len(key_versions)))
+            for timestamp, data in key_versions:
+                f.write(VERSION.pack(timestamp, len(data)))
+                f.write(data)
+        index_offset = f.tell()
+        for key, offset, count in index:
+            encoded_key = key.encode()
+            f.write(struct.pack("<H", len(encoded_key)) + encoded_key + INDEX_ENTRY.pack(offset, count))
+        f.write(FOOTER.pack(index_offset, len(index), SEGMENT_MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(os.path.dirname(path) or ".")
+
+
+class Segment:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        index_offset, n_keys, magic = FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+        if magic != SEGMENT_MAGIC or self.data[: len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+            raise ValueError(f"{path} is not a ps4 segment")
+        self.index = {}  # key --> (offset, count), in key order
+        position = index_offset
+        for _ in range(n_keys):
+            (key_length,) = struct.unpack_from("<H", self.data, position)
+            key = self.data[position + 2 : position + 2 + key_length].decode()
+            position += 2 + key_length
+            self.index[key] = INDEX_ENTRY.unpack_from(self.data, position)
+            position += INDEX_ENTRY.size
+
+    def versions(self, key: str) -> list:
+        # [(ts, encoded value)] of key, oldest first
+        offset, count = self.index.get(key, (0, 0))
+        found = []
+        for _ in range(count):
+            timestamp, length = VERSION.unpack_from(self.data, offset)
+            offset += VERSION.size
+            found.append((timestamp, self.data[offset : offset + length]))
+            offset += length
+        return found
+
+    def items(self) -> Iterator[Tuple[str, list]]:
+        for key in self.index:
+            yield key, self.versions(key)
+
+
+def retain(timestamps: array, keep_versions: Optional[int], keep_seconds: Optional[float], now: int) -> int:
+    # index of the first version to keep: at most the newest keep_versions, none older than keep_seconds,
+    # and the latest version is always kept (it's the current value)
+    start = 0
+    if keep_versions is not None:
+        start = max(start, len(timestamps) - keep_versions)
+    if keep_seconds is not None:
+        cutoff = now - int(keep_seconds * 10_000_000)  # ps4.ts() is in 100ns
+        while start < len(timestamps) and timestamps[start] < cutoff:
+            start += 1
+    return min(start, len(timestamps) - 1)
+
+
+class DurableConfig(Config):
+    def __init__(
+        self,
+        directory: str,
+        commit_delay: float = 0.0,
+        compact_after: int = 100_000,
+        keep_versions: int = None,
+        keep_seconds: float = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.compact_after = compact_after
+        self.keep_versions = keep_versions
+        self.keep_seconds = keep_seconds
+        self.compaction = None  # the running compaction thread
+        self.compaction_error = None  # why the last compaction failed, raised by the next add/compact/close
+        os.makedirs(directory, exist_ok=True)
+        self.number = self._recover()
+        self.wal = WAL(self._path("wal", self.number), commit_delay)
+        self.since_compaction = 0
+
+    def _path(self, kind: str, number: int) -> str:
+        return os.path.join(self.directory, f"{kind}-{number:08d}.{'log' if kind == 'wal' else 'seg'}")
+
+    def _files(self, kind: str) -> list:
+        # [(number, path)] sorted
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(self.directory, name))  # a compaction that didn't finish
+            elif name.startswith(kind + "-"):
+                found.append((int(name[len(kind) + 1 :].split(".")[0]), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def _recover(self) -> int:
+        # replays the newest segment + the wal files after it, returns the wal number to carry on with
+        segments = self._files("segment")
+        number = 0
+        if segments:
+            number, path = segments[-1]
+            versions = [
+                (timestamp, key, data) for key, key_versions in Segment(path).items() for timestamp, data in key_versions
+            ]
+            versions.sort(key=lambda x: x[0])
+            for timestamp, key, data in versions:
+                self._add(key, decode(data), timestamp)
+        for wal_number, path in self._files("wal"):
+            if wal_number >= number:
+                for timestamp, key, data in replay(path):
+                    self._add(key, decode(data), timestamp)
+                number = wal_number
+        return number
+
+    def add(self, key: str, value, sync: bool = True):
+        # like Config.add (keys have to be str here), durable when it returns (unless sync=False).
+        # The record is built and written before memory changes, so a key or value that can't be stored, or a failed
+        # write, leaves nothing behind. write_lock also keeps memory and the wal in the same order
+        key_data = key_bytes(key)
+        data = encode(value)
+        with self.write_lock:
+            self._raise_compaction_error()
+            versions = self.values.get(key)
+            if versions is not None and self.store.find(data) == versions.latest():
+                return None  # same value as now, not a new version
+            timestamp = self._next_timestamp()
+            record = self.wal.append(timestamp, key_data, data)
+            self._add(key, value, timestamp)
+            self.since_compaction += 1
+            if self.since_compaction >= self.compact_after and self.compaction is None:
+                self._start_compaction()
+        if sync:
+            self.wal.wait(record)
+        return timestamp
+
+    def _start_compaction(self):
+        # under write_lock: switch wal files and take a copy of the versions, the rest runs on its own thread
+        self.since_compaction = 0
+        self.number += 1
+        self.wal.switch(self._path("wal", self.number))
+        captured = sorted(
+            (key, versions.ts[: len(versions)], versions.ids[: len(versions)]) for key, versions in self.values.items()
+        )
+        self.compaction = threading.Thread(target=self._compact, args=(self.number, captured), daemon=True)
+        self.compaction.start()
+
+    def _compact(self, number: int, captured: list):
+        # keep_seconds counts back from when the compaction runs, so an idle config still drops its old versions
+        now = ts()
+        store = self.store
+
+        def retained():
+            for key, timestamps, ids in captured:
+                start = retain(timestamps, self.keep_versions, self.keep_seconds, now)
+                yield key, [(timestamps[i], store.data(ids[i], use_cache=False)) for i in range(start, len(timestamps))]
+
+        try:
+            write_segment(self._path("segment", number), retained())
+            for kind in ("segment", "wal"):
+                for old_number, path in self._files(kind):
+                    if old_number < number:
+                        os.remove(path)
+            fsync_dir(self.directory)
+        except BaseException as e:
+            # nothing is lost: the old segment and wal files are only removed after the new segment is on disk
+            self.compaction_error = e
+        finally:
+            self.compaction = None
+
+    def _raise_compaction_error(self):
+        # report a failed compaction once, the one after it gets to try again
+        error, self.compaction_error = self.compaction_error, None
+        if error is not None:
+            raise error
+
+    def compact(self):
+        # compact now and wait for it
+        with self.write_lock:
+            self._raise_compaction_error()
+            if self.compaction is None:
+                self._start_compaction()
+            compaction = self.compaction
+        compaction.join()
+        self._raise_compaction_error()
+
+    def close(self):
+        compaction = self.compaction
+        if compaction is not None:
+            compaction.join()
+        self.wal.close()
+        self._raise_compaction_error()
+
+
+def benchmark(n_writes: int = 20_000, n_threads: int = 8):
+    # fsync per write vs group commit with several writer threads, then recovery time
+    directory = tempfile.mkdtemp()
+    rng = random.Random(0)
+    writes = [(f"key{rng.randrange(1000)}", f"value{i}") for i in range(n_writes)]
+
+    path = os.path.join(directory, "single.log")
+    start = time.perf_counter()
+    with open(path, "ab") as f:
+        for key, value in writes[: n_writes // 10]:
+            f.write(f"{key}\t{value}\n".encode())
+            f.flush()
+            os.fsync(f.fileno())
+    elapsed = time.perf_counter() - start
+    print(f"fsync per write: {n_writes // 10 / elapsed:.0f} writes/s")
+
+    config = DurableConfig(os.path.join(directory, "config"), compact_after=n_writes // 2, keep_versions=3)
+    chunks = [writes[i::n_threads] for i in range(n_threads)]
+
+    def writer(chunk):
+        for key, value in chunk:
+            config.add(key, value)
+
+    threads = [threading.Thread(target=writer, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(
+        f"group commit, {n_threads} writer threads: {n_writes / elapsed:.0f} durable writes/s, "
+        f"{n_writes / config.wal.n_syncs:.1f} writes per fsync"
+    )
+    config.close()
+    expected = {key: config.get(key) for key in config.values}
+
+    start = time.perf_counter()
+    recovered = DurableConfig(os.path.join(directory, "config"))
+    print(f"recovery: {(time.perf_counter() - start) * 1000:.0f}ms for {sum(map(len, recovered.values.values()))} versions")
+    assert {key: recovered.get(key) for key in recovered.values} == expected
+    recovered.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*[int(x) for x in sys.argv[2:]])